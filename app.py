@@ -1,10 +1,13 @@
-from flask import Flask, render_template, jsonify
-import pandas as pd
+from flask import Flask, render_template, jsonify, request, g, Response
 import sqlite3
 import json
-import openai
-from pdfminer.high_level import extract_text
+import time as tm
 from flask_cors import CORS
+from metrics import Metrics
+from storage import compressor, compress_text, decompress_text, decompress_row, ensure_row_versions
+
+# openai and pdfminer are only needed for resume/cover letter generation and are imported there,
+# so starting the app and the status buttons don't pay for them.
 
 def load_config(file_name):
     # Load the config file
@@ -15,8 +18,34 @@ config = load_config('config.json')
 app = Flask(__name__)
 CORS(app)
 app.config['TEMPLATES_AUTO_RELOAD'] = True
+app_metrics = Metrics(namespace='jobscraper_app')
+
+@app.before_request
+def start_request_timer():
+    g.request_start = tm.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown'
+    if 'request_start' in g:
+        app_metrics.observe('request_seconds', tm.perf_counter() - g.request_start, endpoint=endpoint)
+    app_metrics.inc('requests_total', endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    # The app's own request metrics, followed by the ones the scraper exported for its last run
+    text = app_metrics.to_prometheus()
+    try:
+        with open(config.get('metrics_prom_path', './data/metrics.prom'), encoding='utf-8') as f:
+            text += f.read()
+    except FileNotFoundError:
+        pass
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
 def read_pdf(file_path):
+    from pdfminer.high_level import extract_text
+
     try:
         text = extract_text(file_path)
         return text
@@ -40,24 +69,87 @@ def read_pdf(file_path):
 # except:
 #     print("No OpenAI Model found or it's incorrectly specified in the config. Please add one to config.json")
 
+# Fields of a job card in the list, the only ones the /events stream sends
+CARD_COLUMNS = ['id', 'title', 'company', 'location', 'date', 'score', 'applied', 'interview', 'rejected', 'hidden', 'row_version']
+EVENTS_POLL_SECONDS = 2         # how often the stream checks the database for new row versions
+EVENTS_KEEPALIVE_SECONDS = 15   # comment lines sent while idle, so proxies don't drop the connection
+EVENTS_MAX_SECONDS = 300        # each stream ends after this long, the browser reconnects with Last-Event-ID
+
 @app.route('/')
 def home():
+    # The page starts listening for events after the version it was rendered at
+    conn = sqlite3.connect(config["db_path"])
+    row_version = current_row_version(conn)
+    conn.close()
     jobs = read_jobs_from_db()
-    return render_template('jobs.html', jobs=jobs)
+    return render_template('jobs.html', jobs=jobs, row_version=row_version)
+
+def current_row_version(conn):
+    try:
+        row = conn.execute("SELECT version FROM row_versions WHERE table_name = 'jobs'").fetchone()
+    except sqlite3.OperationalError:
+        return 0  # no row versions yet, see verify_db_schema
+    return row[0] if row else 0
+
+def job_events(db_path, since, poll_seconds=EVENTS_POLL_SECONDS, max_seconds=EVENTS_MAX_SECONDS):
+    # Yield an SSE message for every job card inserted or changed after row version `since`.
+    # The scraper writes from another process, so the stream polls the row_version index.
+    yield f"retry: {poll_seconds * 1000}\n\n"
+    conn = sqlite3.connect(db_path)
+    try:
+        started = last_sent = tm.monotonic()
+        while tm.monotonic() - started < max_seconds:
+            try:
+                cursor = conn.execute(f"SELECT {', '.join(CARD_COLUMNS)} FROM jobs WHERE row_version > ? ORDER BY row_version",
+                                      (since,))
+                cards = [dict(zip(CARD_COLUMNS, row)) for row in cursor.fetchall()]
+            except sqlite3.OperationalError:
+                cards = []  # the scraper hasn't created the table (or its row_version column) yet
+            for card in cards:
+                since = card['row_version']
+                yield f"id: {since}\nevent: job\ndata: {json.dumps(card)}\n\n"
+            if cards:
+                last_sent = tm.monotonic()
+            elif tm.monotonic() - last_sent >= EVENTS_KEEPALIVE_SECONDS:
+                last_sent = tm.monotonic()
+                yield ": keepalive\n\n"
+            tm.sleep(poll_seconds)
+    finally:
+        conn.close()
+
+@app.route('/events')
+def events():
+    # Server-Sent Events with new and changed job cards. A reconnecting browser sends Last-Event-ID,
+    # other clients can pass ?since=<row version>. Without either only future changes are sent.
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if since is None:
+        conn = sqlite3.connect(config["db_path"])
+        since = current_row_version(conn)
+        conn.close()
+    try:
+        since = int(since)
+    except ValueError:
+        return jsonify({"error": "since must be a row version"}), 400
+    return Response(job_events(config["db_path"], since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/job/<int:job_id>')
 def job(job_id):
     jobs = read_jobs_from_db()
     return render_template('./templates/job_description.html', job=jobs[job_id])
 
+def rows_to_dicts(cursor):
+    # Map each fetched row to a dictionary keyed by column name, with compressed text columns decoded
+    column_names = [column[0] for column in cursor.description]
+    return [decompress_row(dict(zip(column_names, row)), cursor.connection) for row in cursor.fetchall()]
+
 @app.route('/get_all_jobs')
 def get_all_jobs():
     conn = sqlite3.connect(config["db_path"])
-    query = "SELECT * FROM jobs"
-    df = pd.read_sql_query(query, conn)
-    df = df.sort_values(by='id', ascending=False)
-    df.reset_index(drop=True, inplace=True)
-    jobs = df.to_dict('records')
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM jobs ORDER BY id DESC")
+    jobs = rows_to_dicts(cursor)
+    conn.close()
     return jsonify(jobs)
 
 @app.route('/job_details/<int:job_id>')
@@ -66,14 +158,15 @@ def job_details(job_id):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
     job_tuple = cursor.fetchone()
-    conn.close()
     if job_tuple is not None:
         # Get the column names from the cursor description
         column_names = [column[0] for column in cursor.description]
         # Create a dictionary mapping column names to row values
-        job = dict(zip(column_names, job_tuple))
+        job = decompress_row(dict(zip(column_names, job_tuple)), conn)
+        conn.close()
         return jsonify(job)
     else:
+        conn.close()
         return jsonify({"error": "Job not found"}), 404
 
 @app.route('/hide_job/<int:job_id>', methods=['POST'])
@@ -127,15 +220,19 @@ def get_cover_letter(job_id):
     conn = sqlite3.connect(config["db_path"])
     cursor = conn.cursor()
     cursor.execute("SELECT cover_letter FROM jobs WHERE id = ?", (job_id,))
-    cover_letter = cursor.fetchone()
-    conn.close()
-    if cover_letter is not None:
-        return jsonify({"cover_letter": cover_letter[0]})
-    else:
+    row = cursor.fetchone()
+    if row is None:
+        conn.close()
         return jsonify({"error": "Cover letter not found"}), 404
+    # A job without a cover letter yet returns null
+    cover_letter = decompress_text(row[0], conn)
+    conn.close()
+    return jsonify({"cover_letter": cover_letter})
 
 @app.route('/get_resume/<int:job_id>', methods=['POST'])
 def get_resume(job_id):
+    import openai
+
     print("Resume clicked!")
     conn = sqlite3.connect(config["db_path"])
     cursor = conn.cursor()
@@ -145,7 +242,7 @@ def get_resume(job_id):
         # Get the column names from the cursor description
         column_names = [column[0] for column in cursor.description]
         # Create a dictionary mapping column names to row values
-        job = dict(zip(column_names, job_tuple))
+        job = decompress_row(dict(zip(column_names, job_tuple)), conn)
     resume = read_pdf(config["resume_path"])
 
     # Check if OpenAI API key is empty
@@ -179,13 +276,15 @@ def get_resume(job_id):
 
     query = "UPDATE jobs SET resume = ? WHERE id = ?"
     print(f'Executing query: {query} with job_id: {job_id} and resume: {response}')
-    cursor.execute(query, (response, job_id))
+    cursor.execute(query, (compress_text(response, compressor(conn)), job_id))
     conn.commit()
     conn.close()
     return jsonify({"resume": response}), 200
 
 @app.route('/get_CoverLetter/<int:job_id>', methods=['POST'])
 def get_CoverLetter(job_id):
+    import openai
+
     print("CoverLetter clicked!")
     conn = sqlite3.connect(config["db_path"])
     cursor = conn.cursor()
@@ -207,7 +306,7 @@ def get_CoverLetter(job_id):
     job_tuple = cursor.fetchone()
     if job_tuple is not None:
         column_names = [column[0] for column in cursor.description]
-        job = dict(zip(column_names, job_tuple))
+        job = decompress_row(dict(zip(column_names, job_tuple)), conn)
     
     resume = read_pdf(config["resume_path"])
 
@@ -239,18 +338,19 @@ def get_CoverLetter(job_id):
 
     query = "UPDATE jobs SET cover_letter = ? WHERE id = ?"
     print(f'Executing query: {query} with job_id: {job_id} and cover letter: {response}')
-    cursor.execute(query, (response, job_id))
+    cursor.execute(query, (compress_text(response, compressor(conn)), job_id))
     conn.commit()
     conn.close()
     return jsonify({"cover_letter": response}), 200
 
 def read_jobs_from_db():
     conn = sqlite3.connect(config["db_path"])
-    query = "SELECT * FROM jobs WHERE hidden = 0"
-    df = pd.read_sql_query(query, conn)
-    df = df.sort_values(by='id', ascending=False)
-    # df.reset_index(drop=True, inplace=True)
-    return df.to_dict('records')
+    cursor = conn.cursor()
+    # Best matches first (see ranking.py), jobs stored before scoring was added last
+    cursor.execute("SELECT * FROM jobs WHERE hidden = 0 ORDER BY score DESC, id DESC")
+    jobs = rows_to_dicts(cursor)
+    conn.close()
+    return jobs
 
 def verify_db_schema():
     conn = sqlite3.connect(config["db_path"])
@@ -271,6 +371,13 @@ def verify_db_schema():
         cursor.execute("ALTER TABLE jobs ADD COLUMN resume TEXT")
         print("Added resume column to jobs table")
 
+    if "score" not in [column[1] for column in table_info]:
+        cursor.execute("ALTER TABLE jobs ADD COLUMN score REAL")
+        print("Added score column to jobs table")
+
+    # Row versions for the /events stream
+    ensure_row_versions(conn, "jobs")
+
     conn.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,194 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time as tm
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import main
+from benchmarks.stub_server import (StubServer, load_fixture, LINKEDIN_SEARCH_PATH, LINKEDIN_VIEW_PATH,
+                                    GOOGLE_CAREERS_PATH, WORKDAY_PATH)
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmarks', 'results')
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_config(config_file, server):
+    # The real filters from config.json, pointed at the stub server and a single search query
+    config = main.load_config(config_file)
+    config['proxies'] = {}
+    config['headers'] = {}
+    config['rounds'] = 1
+    config['search_queries'] = config['search_queries'][:1]
+    config['linkedin_search_url'] = server.url + LINKEDIN_SEARCH_PATH
+    return config
+
+def make_jobs(cards, n, offset=0, description=''):
+    # Replicate the recorded job cards into n jobs with unique URLs and titles
+    jobs = []
+    for i in range(offset, offset + n):
+        job = dict(cards[i % len(cards)])
+        job['title'] = f"{job['title']} #{i // len(cards)}"
+        job['job_url'] = f"https://www.linkedin.com/jobs/view/{5000000000 + i}/"
+        job['job_description'] = description
+        jobs.append(job)
+    return jobs
+
+class Recorder:
+    # Collects one result row per timed stage
+    def __init__(self):
+        self.results = []
+
+    @contextlib.contextmanager
+    def stage(self, name, size, items):
+        start = tm.perf_counter()
+        # The pipeline functions print progress for every page/job, keep that out of the timings
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+        seconds = tm.perf_counter() - start
+        self.add(name, size, items, seconds)
+
+    def add(self, name, size, items, seconds):
+        self.results.append({
+            'stage': name,
+            'size': size,
+            'items': items,
+            'seconds': round(seconds, 6),
+            'per_item_us': round(seconds / items * 1e6, 3) if items else None,
+        })
+        size_label = size if size is not None else '-'
+        print(f"{name:40} {size_label:>8} {items:>8} {seconds:10.3f}s")
+
+def bench_fixed(recorder, config, server, session):
+    # Sources that return one page of results regardless of the benchmark size
+    with recorder.stage('get_nvidia_intern_jobs', None, 50):
+        main.get_nvidia_intern_jobs(api_url=server.url + WORKDAY_PATH)
+    with recorder.stage('get_with_retry+transform_google', None, 20):
+        soup = main.get_with_retry(server.url + GOOGLE_CAREERS_PATH, config, session=session)
+        main.transform_google(soup)
+    with recorder.stage('get_with_retry+transform_job', None, 1):
+        soup = main.get_with_retry(server.url + LINKEDIN_VIEW_PATH + '4012345600/', config, session=session)
+        main.transform_job(soup)
+
+def bench_size(recorder, config, session, cards, description, n, desc_sample):
+    from bs4 import BeautifulSoup
+    import pandas as pd
+
+    pages = math.ceil(n / len(cards))
+
+    # Search pages: fetch from the stub, parse, dedupe and filter
+    config['pages_to_scrape'] = pages
+    with recorder.stage('get_jobcards', n, pages * len(cards)):
+        main.get_jobcards(config, session=session)
+
+    # Parsing alone, on an already built soup
+    search_soup = BeautifulSoup(load_fixture('linkedin_search.html'), 'html.parser')
+    with recorder.stage('transform', n, pages * len(cards)):
+        for _ in range(pages):
+            main.transform(search_soup)
+
+    # transform_job edits the soup in place, so every call gets a fresh one. Only the transform is timed.
+    desc_html = load_fixture('linkedin_description.html')
+    sample = min(n, desc_sample)
+    seconds = 0.0
+    for _ in range(sample):
+        soup = BeautifulSoup(desc_html, 'html.parser')
+        start = tm.perf_counter()
+        main.transform_job(soup)
+        seconds += tm.perf_counter() - start
+    recorder.add('transform_job', n, sample, seconds)
+
+    jobs = make_jobs(cards, n)
+    with recorder.stage('remove_irrelevant_jobs[cards]', n, n):
+        main.remove_irrelevant_jobs(jobs, config)
+
+    described = make_jobs(cards, sample, description=description)
+    with recorder.stage('remove_irrelevant_jobs[descriptions]', n, sample):
+        main.remove_irrelevant_jobs(described, config)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config['db_path'] = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(config['db_path'])
+
+        # Half of the candidates are already stored, the other half are new
+        df_existing = pd.DataFrame(make_jobs(cards, n, description=description))
+        df_existing['date_loaded'] = str(datetime.now())
+        # The same write path as process_jobs: compression, row version triggers, then the insert
+        with recorder.stage('store_jobs[create]', n, n):
+            main.store_jobs(conn, df_existing, config['jobs_tablename'], row_versions=True)
+
+        candidates = make_jobs(cards, n, offset=n // 2, description=description)
+        with recorder.stage('find_new_jobs', n, n):
+            new_jobs = main.find_new_jobs(candidates, conn, config)
+
+        df_new = pd.DataFrame(new_jobs)
+        df_new['date_loaded'] = str(datetime.now())
+        with recorder.stage('store_jobs[update]', n, len(df_new)):
+            main.store_jobs(conn, df_new, config['jobs_tablename'], row_versions=True)
+        conn.close()
+
+def run_benchmarks(sizes=DEFAULT_SIZES, config_file=None, desc_sample=1000):
+    # Run every stage at every size against the stub server and return the report as a dict
+    import requests
+    from bs4 import BeautifulSoup
+
+    config_file = config_file or os.path.join(REPO_DIR, 'config.json')
+    recorder = Recorder()
+    description = main.transform_job(BeautifulSoup(load_fixture('linkedin_description.html'), 'html.parser'))
+    cards = main.transform(BeautifulSoup(load_fixture('linkedin_search.html'), 'html.parser'))
+
+    print(f"{'stage':40} {'size':>8} {'items':>8} {'time':>11}")
+    with StubServer() as server, requests.Session() as session:
+        config = bench_config(config_file, server)
+        bench_fixed(recorder, config, server, session)
+        for n in sizes:
+            bench_size(recorder, config, session, cards, description, n, desc_sample)
+
+    return {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': sizes,
+        'desc_sample': desc_sample,
+        'results': recorder.results,
+    }
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the scrape pipeline offline against recorded pages.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="number of jobs per run")
+    parser.add_argument('--desc-sample', type=int, default=1000,
+                        help="max jobs for the description stages (transform_job, language detection)")
+    parser.add_argument('--config', help="config file with the filters to use (default: config.json)")
+    parser.add_argument('--output', help="result file (default: benchmarks/results/<revision>-<timestamp>.json)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.config, args.desc_sample)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{report['revision'] or 'unknown'}-{stamp}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == '__main__':
+    main_cli()
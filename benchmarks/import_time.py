@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported just by importing one of the entry points
+HEAVY_MODULES = ['pandas', 'numpy', 'selenium', 'langdetect', 'bs4', 'requests', 'smtplib', 'openai', 'pdfminer']
+
+# Cumulative import time budget per entry point, in microseconds
+BUDGETS_US = {
+    'main': 150000,
+    'daemon': 150000,
+    'app': 600000,
+}
+
+def measure_import(module, python=sys.executable):
+    # Import the module in a fresh interpreter with -X importtime and parse the report from stderr.
+    # Returns the cumulative time of the module itself and every top-level package it pulled in.
+    result = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    packages = {}
+    total_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        # Format: "import time: <self us> | <cumulative us> | <indented module name>"
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        self_us, cumulative_us = int(self_us), int(cumulative_us)
+        top_level = name.strip().split('.')[0]
+        packages[top_level] = packages.get(top_level, 0) + self_us
+        if name.strip() == module:
+            total_us = cumulative_us
+    return {'module': module, 'cumulative_us': total_us, 'packages_us': packages}
+
+def check(results, timing=True):
+    # Return a list of human readable budget violations. timing=False only checks for heavy imports,
+    # the time budgets need the best of several runs (--repeat) to be stable.
+    problems = []
+    for result in results:
+        heavy = [name for name in HEAVY_MODULES if name in result['packages_us']]
+        if heavy:
+            problems.append(f"import {result['module']} pulls in {', '.join(heavy)}")
+        budget = BUDGETS_US.get(result['module'])
+        if timing and budget is not None and result['cumulative_us'] > budget:
+            problems.append(f"import {result['module']} took {result['cumulative_us']}us, budget is {budget}us")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the scraper entry points.")
+    parser.add_argument('modules', nargs='*', default=list(BUDGETS_US), help="modules to import (default: all entry points)")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per module, the fastest one is kept")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for module in args.modules:
+        runs = [measure_import(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r['cumulative_us'])
+        results.append(best)
+        print(f"{module:10} {best['cumulative_us'] / 1000:8.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    problems = check(results)
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+LINKEDIN_SEARCH_PATH = '/jobs-guest/jobs/api/seeMoreJobPostings/search'
+LINKEDIN_VIEW_PATH = '/jobs/view/'
+GOOGLE_CAREERS_PATH = '/about/careers/applications/jobs/results'
+WORKDAY_PATH = '/wday/cxs/nvidia/jobs'
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Serves the recorded pages in place of LinkedIn, Google careers and the NVIDIA Workday API
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    fixtures = {}
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == LINKEDIN_SEARCH_PATH:
+            # Shift the posting ids by the page offset so every page returns distinct jobs
+            start = int(parse_qs(url.query).get('start', ['0'])[0])
+            body = re.sub(rb'urn:li:jobPosting:(\d+)', lambda m: b'urn:li:jobPosting:%d' % (int(m.group(1)) + start),
+                          self.fixtures['linkedin_search'])
+            self.send_body(body, 'text/html; charset=utf-8')
+        elif url.path.startswith(LINKEDIN_VIEW_PATH):
+            self.send_body(self.fixtures['linkedin_description'], 'text/html; charset=utf-8')
+        elif url.path == GOOGLE_CAREERS_PATH:
+            self.send_body(self.fixtures['google_careers'], 'text/html; charset=utf-8')
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        # Drain the request body so keep-alive connections stay usable
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if urlparse(self.path).path == WORKDAY_PATH:
+            self.send_body(self.fixtures['workday_jobs'], 'application/json')
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer:
+    # Local HTTP server on a free port. Use as a context manager:
+    #     with StubServer() as server:
+    #         get_with_retry(server.url + LINKEDIN_VIEW_PATH + '123/', config)
+    def __init__(self, host='127.0.0.1', port=0):
+        StubHandler.fixtures = {
+            'linkedin_search': load_fixture('linkedin_search.html'),
+            'linkedin_description': load_fixture('linkedin_description.html'),
+            'google_careers': load_fixture('google_careers.html'),
+            'workday_jobs': load_fixture('workday_jobs.json'),
+        }
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+if __name__ == '__main__':
+    with StubServer(port=8765) as server:
+        print(f"Serving recorded fixtures at {server.url}, press Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
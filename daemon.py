@@ -0,0 +1,151 @@
+import os
+import signal
+import threading
+import time as tm
+
+from metrics import REGISTRY, write_reports
+from main import (load_config, create_connection, create_driver, get_jobcards, get_google_jobs,
+                  get_nvidia_intern_jobs, remove_duplicates, process_jobs)
+
+# Sources other than the LinkedIn search queries. Each one is scheduled as a single task.
+SOURCES = {
+    'google': lambda state: get_google_jobs(driver=state.get_driver()),
+    'nvidia': lambda state: get_nvidia_intern_jobs(),
+}
+
+DEFAULT_DAEMON_CONFIG = {
+    "default_interval": 28800,   # seconds between runs of a query/source without its own interval
+    "sources": {"google": 28800},
+    "tick": 5,                   # seconds between scheduler wake-ups
+}
+
+class DaemonState:
+    # Warm resources that survive between scheduler cycles
+    def __init__(self, config):
+        import requests
+
+        self.config = config
+        self.session = requests.Session()
+        self.driver = None
+        self.conn = create_connection(config)
+
+    def get_driver(self):
+        # Chrome is slow to start, so only start it once and keep it for later cycles
+        if self.driver is None:
+            self.driver = create_driver()
+        return self.driver
+
+    def reset_driver(self):
+        # Drop a browser that crashed or errored, the next cycle that needs one starts a fresh one
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print("Error closing the browser: ", e)
+            self.driver = None
+
+    def reload(self, config):
+        # Keep the session and browser; only reconnect if the database moved
+        if config['db_path'] != self.config['db_path']:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = create_connection(config)
+        self.config = config
+
+    def close(self):
+        self.reset_driver()
+        self.session.close()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def daemon_config(config):
+    # The optional "daemon" section of config.json, filled in with defaults
+    settings = dict(DEFAULT_DAEMON_CONFIG)
+    settings.update(config.get('daemon', {}))
+    return settings
+
+def query_key(query):
+    return f"linkedin:{query['keywords']}|{query['location']}|{query.get('f_WT', '')}"
+
+def build_tasks(config):
+    # Map every task key to (interval, kind, payload). Search queries may set their own "interval".
+    settings = daemon_config(config)
+    tasks = {}
+    for query in config['search_queries']:
+        tasks[query_key(query)] = (query.get('interval', settings['default_interval']), 'linkedin', query)
+    for source, interval in settings['sources'].items():
+        if source not in SOURCES:
+            print(f"Unknown source in daemon config: {source}")
+            continue
+        tasks[source] = (interval or settings['default_interval'], 'source', source)
+    return tasks
+
+def run_cycle(due, state):
+    # Scrape every due task, then run the shared pipeline once over the combined job cards
+    queries = [payload for interval, kind, payload in due if kind == 'linkedin']
+    with REGISTRY.span('get_jobcards'):
+        all_jobs = get_jobcards(state.config, queries=queries, session=state.session) if queries else []
+    for interval, kind, payload in due:
+        if kind == 'source':
+            try:
+                with REGISTRY.span(f'{payload}_jobs'):
+                    all_jobs += SOURCES[payload](state)
+            except Exception as e:
+                print(f"Error scraping {payload}: ", e)
+                state.reset_driver()
+    all_jobs = remove_duplicates(all_jobs, state.config)
+    process_jobs(all_jobs, state.conn, state.config, session=state.session)
+
+def run_daemon(config_file):
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, stopping after the current cycle...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    config = load_config(config_file)
+    config_mtime = os.path.getmtime(config_file)
+    state = DaemonState(config)
+    tasks = build_tasks(config)
+    next_run = {key: 0 for key in tasks}
+    print(f"Daemon started with {len(tasks)} task(s)")
+
+    try:
+        while not stop.is_set():
+            # Hot reload: pick up config.json edits without restarting the process
+            try:
+                mtime = os.path.getmtime(config_file)
+                if mtime != config_mtime:
+                    config_mtime = mtime
+                    config = load_config(config_file)
+                    state.reload(config)
+                    tasks = build_tasks(config)
+                    # New tasks run right away, existing ones keep their schedule
+                    next_run = {key: next_run.get(key, 0) for key in tasks}
+                    print(f"Reloaded {config_file}, {len(tasks)} task(s) scheduled")
+            except (OSError, ValueError) as e:
+                print(f"Could not reload {config_file}, keeping the previous config: {e}")
+
+            now = tm.time()
+            due_keys = [key for key in tasks if next_run[key] <= now]
+            if due_keys:
+                start_time = tm.perf_counter()
+                # Counters and histograms accumulate over the daemon's lifetime, the trace covers the last cycle
+                REGISTRY.reset_spans()
+                try:
+                    with REGISTRY.span('run'):
+                        run_cycle([tasks[key] for key in due_keys], state)
+                except Exception as e:
+                    print("Error during scrape cycle: ", e)
+                write_reports(config)
+                for key in due_keys:
+                    next_run[key] = tm.time() + tasks[key][0]
+                print(f"Cycle of {len(due_keys)} task(s) finished in {tm.perf_counter() - start_time:.2f} seconds")
+            stop.wait(daemon_config(config)['tick'])
+    finally:
+        state.close()
+        print("Daemon stopped")
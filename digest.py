@@ -0,0 +1,192 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from metrics import REGISTRY
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
+SNIPPET_LENGTH = 300
+
+DEFAULT_SMTP_CONFIG = {
+    "host": "smtp.gmail.com",
+    "port": 587,
+    "starttls": True,   # set to false, together with "login": false, for a local SMTP stand-in
+    "login": True,      # log in with GMAIL_EMAIL / GMAIL_PASSWORD
+}
+
+_env = None
+
+def template_env():
+    # Loaded on first use and kept, so a long-running process compiles the templates once
+    global _env
+    if _env is None:
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
+        _env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=select_autoescape(['html']),
+                           trim_blocks=True, lstrip_blocks=True)
+    return _env
+
+def job_source(job):
+    # Group name shown in the digest for the site a job was found on
+    if 'linkedin.com' in job['job_url']:
+        return 'LinkedIn'
+    elif 'google.com' in job['job_url']:
+        return 'Google Careers'
+    elif 'apple.com' in job['job_url']:
+        return 'Apple Careers'
+    elif 'nvidia.com' in job['job_url'] or 'nvidia.wd5.myworkdayjobs.com' in job['job_url']:
+        return 'NVIDIA Careers'
+    return job.get('company', 'Other')
+
+def snippet(text):
+    text = ' '.join((text or '').split())
+    return text if len(text) <= SNIPPET_LENGTH else text[:SNIPPET_LENGTH].rsplit(' ', 1)[0] + '…'
+
+def render_digest(joblist):
+    # Render the subject, plain-text and HTML bodies for a list of jobs
+    groups = defaultdict(list)
+    for job in joblist:
+        groups[job_source(job)].append(dict(job, snippet=snippet(job.get('job_description'))))
+    for jobs in groups.values():
+        # Best matches first (see ranking.py), then the newest
+        jobs.sort(key=lambda x: (x.get('score') or 0, x['date']), reverse=True)
+
+    context = {'total': len(joblist), 'groups': list(groups.items())}
+    env = template_env()
+    subject = f"Job Scraper – {len(joblist)} New Jobs"
+    return subject, env.get_template('digest.txt').render(context), env.get_template('digest.html').render(context)
+
+def subscriptions(config):
+    # Recipients and what each wants to hear about. Without a "subscriptions" section everything goes to RECIPIENT_EMAIL.
+    subs = config.get('subscriptions')
+    if subs:
+        return subs
+    recipient = os.getenv("RECIPIENT_EMAIL")
+    return [{"email": recipient}] if recipient else []
+
+def matches(job, subscription):
+    # Every filter a subscription sets must match. Word lists match case-insensitive substrings, like the config filters.
+    def contains_any(text, words):
+        return any(word.lower() in (text or '').lower() for word in words)
+
+    if subscription.get('title_include') and not contains_any(job['title'], subscription['title_include']):
+        return False
+    if subscription.get('title_exclude') and contains_any(job['title'], subscription['title_exclude']):
+        return False
+    if subscription.get('companies') and not contains_any(job['company'], subscription['companies']):
+        return False
+    if subscription.get('keywords') and not contains_any(job.get('job_description'), subscription['keywords']):
+        return False
+    if subscription.get('sources') and job_source(job) not in subscription['sources']:
+        return False
+    return True
+
+def ensure_ledger(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS sent_jobs (
+                        recipient TEXT NOT NULL,
+                        job_url TEXT NOT NULL,
+                        sent_at TEXT NOT NULL,
+                        PRIMARY KEY (recipient, job_url))""")
+
+def already_sent(conn, recipient, job_urls):
+    # The subset of job_urls that were mailed to the recipient before
+    sent = set()
+    job_urls = list(job_urls)
+    for i in range(0, len(job_urls), 500):
+        chunk = job_urls[i:i + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        rows = conn.execute(f"SELECT job_url FROM sent_jobs WHERE recipient = ? AND job_url IN ({placeholders})", [recipient, *chunk])
+        sent.update(row[0] for row in rows)
+    return sent
+
+def stored_jobs(conn, config):
+    # Jobs in the database that are recent enough to mail: loaded within the last days_to_scrape days and not hidden.
+    # A job that couldn't be mailed in an earlier run is picked up again from here.
+    from storage import decompress_row
+
+    table_name = config.get('jobs_tablename', 'jobs')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone() is None:
+        return []
+    since = str(datetime.now() - timedelta(days=config.get('days_to_scrape', 1)))
+    cursor = conn.execute(f'SELECT * FROM "{table_name}" WHERE date_loaded >= ? AND NOT hidden', (since,))
+    columns = [column[0] for column in cursor.description]
+    return [decompress_row(dict(zip(columns, row)), conn) for row in cursor]
+
+def build_messages(joblist, conn, config, sender):
+    # One message per recipient with the matching jobs they haven't been sent yet
+    from email.message import EmailMessage
+
+    if conn is not None:
+        # This run's jobs are normally stored already, the stored ones also cover earlier runs
+        stored = stored_jobs(conn, config)
+        urls = {job['job_url'] for job in stored}
+        joblist = stored + [job for job in joblist if job['job_url'] not in urls]
+
+    messages = []
+    for subscription in subscriptions(config):
+        recipient = subscription['email']
+        matching = [job for job in joblist if matches(job, subscription)]
+        sent = already_sent(conn, recipient, (job['job_url'] for job in matching)) if conn is not None else set()
+        jobs = [job for job in matching if job['job_url'] not in sent]
+        if not jobs:
+            continue
+        subject, plain_text, html_content = render_digest(jobs)
+        msg = EmailMessage()
+        msg['Subject'] = subject
+        msg['From'] = sender
+        msg['To'] = recipient
+        msg.set_content(plain_text)  # fallback for non-HTML clients
+        msg.add_alternative(html_content, subtype='html')
+        messages.append((recipient, jobs, msg))
+    return messages
+
+def send_digest(joblist, conn, config):
+    # Mail each subscriber the new jobs that match their subscription, over a single SMTP session.
+    # The sent_jobs ledger is updated after every message, so a job is never mailed twice to the same person,
+    # and the stored jobs missing from it are mailed on the next call when a message fails.
+    # conn may be None when the database can't be opened; the digest is then sent without the ledger.
+    import smtplib
+
+    if conn is None:
+        # Better to risk mailing a job twice than to mail nothing
+        print("No database connection, sending the digest without the sent jobs ledger")
+    else:
+        ensure_ledger(conn)
+    settings = dict(DEFAULT_SMTP_CONFIG)
+    settings.update(config.get('smtp', {}))
+    sender = os.getenv("GMAIL_EMAIL") or settings.get('sender')
+
+    messages = build_messages(joblist, conn, config, sender)
+    if not messages:
+        print("No new jobs to mail")
+        return
+
+    try:
+        with smtplib.SMTP(host=settings['host'], port=settings['port']) as smtp:
+            smtp.ehlo()
+            if settings['starttls']:
+                smtp.starttls()  # 建立加密傳輸
+                smtp.ehlo()
+            if settings['login']:
+                password = os.getenv("GMAIL_PASSWORD")
+                if not password or not sender:
+                    raise ValueError("GMAIL_EMAIL / GMAIL_PASSWORD env variables not set")
+                smtp.login(sender, password)
+            for recipient, jobs, msg in messages:
+                # One refused recipient doesn't keep the others from getting their digest
+                try:
+                    smtp.send_message(msg)
+                except smtplib.SMTPException as e:
+                    REGISTRY.inc('email_errors_total')
+                    print(f"Could not send the digest to {recipient}: {e}")
+                    continue
+                if conn is not None:
+                    now = datetime.now().isoformat(timespec='seconds')
+                    conn.executemany("INSERT OR IGNORE INTO sent_jobs (recipient, job_url, sent_at) VALUES (?, ?, ?)",
+                                     [(recipient, job['job_url'], now) for job in jobs])
+                    conn.commit()
+                REGISTRY.inc('emails_sent_total')
+                REGISTRY.inc('emailed_jobs_total', len(jobs))
+                print(f"Sent {len(jobs)} job(s) to {recipient}")
+    except Exception as e:
+        REGISTRY.inc('email_errors_total')
+        print("Error message: ", e)
@@ -1,38 +1,59 @@
 import os
-import requests
+import argparse
 import json
 import sqlite3
 import sys
 from sqlite3 import Error
-from bs4 import BeautifulSoup
 import time as tm
 from itertools import groupby
 from datetime import datetime, timedelta, time
-import pandas as pd
-from urllib.parse import quote
-from langdetect import detect
-from langdetect.lang_detect_exception import LangDetectException
-
-import smtplib
-from email.message import EmailMessage
-from collections import defaultdict
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+from urllib.parse import quote, urlparse
 import pprint
 import re
 
-def get_google_jobs():
+from metrics import REGISTRY, write_reports
+from storage import compress_df, export_parquet, compact, ensure_row_versions
+from digest import send_digest
+from ranking import select_for_descriptions, rank_jobs
+
+LINKEDIN_SEARCH_URL = "https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search"
+GOOGLE_CAREERS_URL = "https://www.google.com/about/careers/applications/jobs/results?q=%22Product%20Designer%22&location=United%20States#!t=jo&jid=127025001&"
+NVIDIA_WORKDAY_URL = "https://nvidia.wd5.myworkdayjobs.com/wday/cxs/nvidia/jobs"
+
+# Heavy dependencies (requests, bs4, pandas, langdetect, selenium) are imported inside the
+# functions that use them, so `import main` and `python main.py --help` stay fast.
+
+def create_driver():
+    # Start a headless Chrome instance for the JS-rendered career sites
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
     options = Options()
     options.add_argument("--headless")
-    driver = webdriver.Chrome(options=options)
+    return webdriver.Chrome(options=options)
+
+def get_google_jobs(driver=None, url=GOOGLE_CAREERS_URL):
+    # A driver passed in by the caller (e.g. the daemon) is kept open for reuse
+    from bs4 import BeautifulSoup
+
+    owns_driver = driver is None
+    if owns_driver:
+        driver = create_driver()
 
-    url = ("https://www.google.com/about/careers/applications/jobs/results?q=%22Product%20Designer%22&location=United%20States#!t=jo&jid=127025001&")
     driver.get(url)
     tm.sleep(3)  # Wait for JS to load; increase if needed
 
     soup = BeautifulSoup(driver.page_source, "html.parser")
-    driver.quit()
+    if owns_driver:
+        driver.quit()
+
+    joblist = transform_google(soup)
+    print(f"Scraped {len(joblist)} Google job(s)")
+    pprint.pprint(joblist)
+    return joblist
 
+def transform_google(soup):
+    # Parsing the job links from the rendered Google careers results page
     joblist = []
     # Find all <a> with href containing 'jobs/results/'
     job_links = soup.find_all('a', href=re.compile(r'^jobs/results/'))
@@ -70,15 +91,13 @@ def get_google_jobs():
             'rejected': 0
         }
         joblist.append(job)
-
-    print(f"Scraped {len(joblist)} Google job(s)")
-    pprint.pprint(joblist)
     return joblist
 
-def get_nvidia_intern_jobs():
+def get_nvidia_intern_jobs(api_url=NVIDIA_WORKDAY_URL):
+    # api_url is the Workday jobs API endpoint for NVIDIA
+    import requests
+
     joblist = []
-    # Workday jobs API endpoint for NVIDIA (example)
-    api_url = "https://nvidia.wd5.myworkdayjobs.com/wday/cxs/nvidia/jobs"
 
     # Typical POST body payload for Workday job search, with filters for internships
     payload = {
@@ -100,30 +119,7 @@ def get_nvidia_intern_jobs():
     try:
         response = requests.post(api_url, json=payload, headers=headers)
         response.raise_for_status()
-        data = response.json()
-
-        # The jobs list may be under 'jobPostings' or similar key; inspect actual response
-        jobs = data.get('jobPostings', [])
-        for job in jobs:
-            # Parse job fields; keys depend on actual API response structure
-            title = job.get('title', 'No Title')
-            location = job.get('locations', [{}])[0].get('name', '')
-            job_id = job.get('id', '')
-            url = f"https://nvidia.wd5.myworkdayjobs.com/wday/cxs/nvidia/jobs/{job_id}"
-
-            joblist.append({
-                'title': title,
-                'company': 'NVIDIA',
-                'location': location,
-                'date': datetime.today().strftime("%Y-%m-%d"),
-                'job_url': url,
-                'job_description': job.get('description', ''),
-                'applied': 0,
-                'hidden': 0,
-                'interview': 0,
-                'rejected': 0,
-            })
-
+        joblist = transform_workday(response.json())
         print(f"Scraped {len(joblist)} NVIDIA intern job(s)")
         return joblist
 
@@ -131,25 +127,66 @@ def get_nvidia_intern_jobs():
         print("Error fetching NVIDIA jobs:", e)
         return joblist
 
+def transform_workday(data):
+    # Parsing the job postings from a Workday jobs API response
+    joblist = []
+    # The jobs list may be under 'jobPostings' or similar key; inspect actual response
+    jobs = data.get('jobPostings', [])
+    for job in jobs:
+        # Parse job fields; keys depend on actual API response structure
+        title = job.get('title', 'No Title')
+        location = job.get('locations', [{}])[0].get('name', '')
+        job_id = job.get('id', '')
+        url = f"https://nvidia.wd5.myworkdayjobs.com/wday/cxs/nvidia/jobs/{job_id}"
+
+        joblist.append({
+            'title': title,
+            'company': 'NVIDIA',
+            'location': location,
+            'date': datetime.today().strftime("%Y-%m-%d"),
+            'job_url': url,
+            'job_description': job.get('description', ''),
+            'applied': 0,
+            'hidden': 0,
+            'interview': 0,
+            'rejected': 0,
+        })
+
+    return joblist
+
 def load_config(file_name):
     # Load the config file
     with open(file_name) as f:
         return json.load(f)
 
-def get_with_retry(url, config, retries=3, delay=1):
-    # Get the URL with retries and delay
+def get_with_retry(url, config, retries=3, delay=1, session=None):
+    # Get the URL with retries and delay. A requests.Session keeps connections warm between calls.
+    import requests
+    from bs4 import BeautifulSoup
+
+    client = session if session is not None else requests
+    host = urlparse(url).hostname
     for i in range(retries):
         try:
-            if len(config['proxies']) > 0:
-                r = requests.get(url, headers=config['headers'], proxies=config['proxies'], timeout=5)
-            else:
-                r = requests.get(url, headers=config['headers'], timeout=5)
-            return BeautifulSoup(r.content, 'html.parser')
+            with REGISTRY.timer('fetch_seconds', host=host):
+                if len(config['proxies']) > 0:
+                    r = client.get(url, headers=config['headers'], proxies=config['proxies'], timeout=5)
+                else:
+                    r = client.get(url, headers=config['headers'], timeout=5)
+            REGISTRY.inc('fetch_requests_total', host=host, status=r.status_code)
+            REGISTRY.inc('fetch_bytes_total', len(r.content), host=host)
+            with REGISTRY.timer('html_parse_seconds', host=host):
+                return BeautifulSoup(r.content, 'html.parser')
         except requests.exceptions.Timeout:
+            REGISTRY.inc('fetch_errors_total', host=host, error='Timeout')
             print(f"Timeout occurred for URL: {url}, retrying in {delay}s...")
             tm.sleep(delay)
         except Exception as e:
+            REGISTRY.inc('fetch_errors_total', host=host, error=type(e).__name__)
             print(f"An error occurred while retrieving the URL: {url}, error: {e}")
+        # Whatever went wrong, another attempt follows unless this was the last one
+        if i < retries - 1:
+            REGISTRY.inc('fetch_retries_total', host=host)
     return None
 
 def transform(soup):
@@ -210,18 +247,27 @@ def transform_job(soup):
         return "Could not find Job Description"
 
 def safe_detect(text):
+    from langdetect import detect
+    from langdetect.lang_detect_exception import LangDetectException
+
     try:
-        return detect(text)
+        with REGISTRY.timer('langdetect_seconds'):
+            return detect(text)
     except LangDetectException:
         return 'en'
 
 def remove_irrelevant_jobs(joblist, config):
     #Filter out jobs based on description, title, and language. Set up in config.json.
-    new_joblist = [job for job in joblist if not any(word.lower() in job['job_description'].lower() for word in config['desc_words'])]   
-    new_joblist = [job for job in new_joblist if not any(word.lower() in job['title'].lower() for word in config['title_exclude'])] if len(config['title_exclude']) > 0 else new_joblist
-    new_joblist = [job for job in new_joblist if any(word.lower() in job['title'].lower() for word in config['title_include'])] if len(config['title_include']) > 0 else new_joblist
-    new_joblist = [job for job in new_joblist if safe_detect(job['job_description']) in config['languages']] if len(config['languages']) > 0 else new_joblist
-    new_joblist = [job for job in new_joblist if not any(word.lower() in job['company'].lower() for word in config['company_exclude'])] if len(config['company_exclude']) > 0 else new_joblist
+    #The number of jobs each rule drops is counted in the filter_dropped_total metric.
+    def count_dropped(rule, before, after):
+        REGISTRY.inc('filter_dropped_total', len(before) - len(after), rule=rule)
+        return after
+
+    new_joblist = count_dropped('desc_words', joblist, [job for job in joblist if not any(word.lower() in job['job_description'].lower() for word in config['desc_words'])])
+    new_joblist = count_dropped('title_exclude', new_joblist, [job for job in new_joblist if not any(word.lower() in job['title'].lower() for word in config['title_exclude'])]) if len(config['title_exclude']) > 0 else new_joblist
+    new_joblist = count_dropped('title_include', new_joblist, [job for job in new_joblist if any(word.lower() in job['title'].lower() for word in config['title_include'])]) if len(config['title_include']) > 0 else new_joblist
+    new_joblist = count_dropped('languages', new_joblist, [job for job in new_joblist if safe_detect(job['job_description']) in config['languages']]) if len(config['languages']) > 0 else new_joblist
+    new_joblist = count_dropped('company_exclude', new_joblist, [job for job in new_joblist if not any(word.lower() in job['company'].lower() for word in config['company_exclude'])]) if len(config['company_exclude']) > 0 else new_joblist
 
     return new_joblist
 
@@ -254,13 +300,28 @@ def create_connection(config):
     conn = None
     path = config['db_path']
     try:
+        # A fresh checkout (e.g. the GitHub Actions runner) has no data directory yet
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
         conn = sqlite3.connect(path) # creates a SQL database in the 'data' directory
         #print(sqlite3.version)
-    except Error as e:
+    except (Error, OSError) as e:
         print(e)
 
     return conn
 
+# Data types mapping from pandas to SQLite
+SQLITE_TYPES = {
+    'int64': 'INTEGER',
+    'float64': 'REAL',
+    'datetime64[ns]': 'TIMESTAMP',
+    'object': 'TEXT',
+    'str': 'TEXT',
+    'string': 'TEXT',
+    'bool': 'INTEGER'
+}
+
 def create_table(conn, df, table_name):
     ''''
     # Create a new table with the data from the dataframe
@@ -268,18 +329,9 @@ def create_table(conn, df, table_name):
     print (f"Created the {table_name} table and added {len(df)} records")
     '''
     # Create a new table with the data from the DataFrame
-    # Prepare data types mapping from pandas to SQLite
-    type_mapping = {
-        'int64': 'INTEGER',
-        'float64': 'REAL',
-        'datetime64[ns]': 'TIMESTAMP',
-        'object': 'TEXT',
-        'bool': 'INTEGER'
-    }
-    
     # Prepare a string with column names and their types
     columns_with_types = ', '.join(
-        f'"{column}" {type_mapping[str(df.dtypes[column])]}'
+        f'"{column}" {SQLITE_TYPES[str(df.dtypes[column])]}'
         for column in df.columns
     )
     
@@ -308,23 +360,52 @@ def create_table(conn, df, table_name):
     
     # Commit the transaction
     conn.commit()
+    REGISTRY.inc('db_rows_written_total', len(df), table=table_name)
 
     print(f"Created the {table_name} table and added {len(df)} records")
 
 def update_table(conn, df, table_name):
     # Update the existing table with new records.
-    df_existing = pd.read_sql(f'select * from {table_name}', conn)
+    import pandas as pd
+
+    # Only the columns duplicates are detected on, so the stored descriptions are not read back
+    df_existing = pd.read_sql(f'select title, company, date from {table_name}', conn)
 
     # Create a dataframe with unique records in df that are not in df_existing
     df_new_records = pd.concat([df, df_existing, df_existing]).drop_duplicates(['title', 'company', 'date'], keep=False)
 
     # If there are new records, append them to the existing table
     if len(df_new_records) > 0:
+        add_missing_columns(conn, df_new_records, table_name)
         df_new_records.to_sql(table_name, conn, if_exists='append', index=False)
+        REGISTRY.inc('db_rows_written_total', len(df_new_records), table=table_name)
         print (f"Added {len(df_new_records)} new records to the {table_name} table")
     else:
         print (f"No new records to add to the {table_name} table")
 
+def add_missing_columns(conn, df, table_name):
+    # Tables created by older versions lack columns added since (e.g. score), add them before appending
+    existing = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+    for column in df.columns:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{column}" {SQLITE_TYPES.get(str(df.dtypes[column]), "TEXT")}')
+            print(f"Added {column} column to the {table_name} table")
+    conn.commit()
+
+def store_jobs(conn, df, table_name, row_versions=False):
+    # The database write path: compress the text columns (see storage.py), then create the table or append to it.
+    # row_versions keeps the row versions that feed the app's /events stream, the triggers have to exist
+    # before new rows are added.
+    df = compress_df(df, conn)
+    if table_exists(conn, table_name):
+        if row_versions:
+            ensure_row_versions(conn, table_name)
+        update_table(conn, df, table_name)
+    else:
+        create_table(conn, df, table_name)
+        if row_versions:
+            ensure_row_versions(conn, table_name)
+
 def table_exists(conn, table_name):
     # Check if the table already exists in the database
     cur = conn.cursor()
@@ -333,27 +414,52 @@ def table_exists(conn, table_name):
         return True
     return False
 
-def job_exists(df, job):
-    # Check if the job already exists in the dataframe
-    if df.empty:
-        return False
-    #return ((df['title'] == job['title']) & (df['company'] == job['company']) & (df['date'] == job['date'])).any()
-    #The job exists if there's already a job in the database that has the same URL
-    return ((df['job_url'] == job['job_url']).any() | (((df['title'] == job['title']) & (df['company'] == job['company']) & (df['date'] == job['date'])).any()))
-
-def get_jobcards(config):
-    #Function to get the job cards from the search results page
+def existing_job_keys(conn, table_name):
+    # Load the keys a job is matched on: its URL, and its (title, company, date) triple
+    urls = set()
+    triples = set()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT job_url, title, company, date FROM {table_name}")
+    except Error:
+        # A table created from an empty run has no job columns (and no rows) yet
+        return urls, triples
+    for job_url, title, company, date in cur:
+        urls.add(job_url)
+        triples.add((title, company, date))
+    return urls, triples
+
+def job_exists(keys, job):
+    # Check if the job already exists, given the keys from existing_job_keys
+    #The job exists if there's already a job in the database that has the same URL, or the same title, company and date
+    urls, triples = keys
+    return job['job_url'] in urls or (job['title'], job['company'], job['date']) in triples
+
+def search_page_url(config, query, page):
+    # URL of one page (25 job cards) of LinkedIn search results for a query
+    search_url = config.get('linkedin_search_url', LINKEDIN_SEARCH_URL)
+    keywords = quote(query['keywords']) # URL encode the keywords
+    location = quote(query['location']) # URL encode the location
+    return f"{search_url}?keywords={keywords}&location={location}&f_TPR=&f_WT={query['f_WT']}&geoId=&f_TPR={config['timespan']}&start={25*page}"
+
+def get_jobcards(config, queries=None, session=None):
+    #Function to get the job cards from the search results page. Defaults to every query in the config.
+    if queries is None:
+        queries = config['search_queries']
     all_jobs = []
     for k in range(0, config['rounds']):
-        for query in config['search_queries']:
-            keywords = quote(query['keywords']) # URL encode the keywords
-            location = quote(query['location']) # URL encode the location
+        for query in queries:
             for i in range (0, config['pages_to_scrape']):
-                url = f"https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search?keywords={keywords}&location={location}&f_TPR=&f_WT={query['f_WT']}&geoId=&f_TPR={config['timespan']}&start={25*i}"
-                soup = get_with_retry(url, config)
-                jobs = transform(soup)
-                all_jobs = all_jobs + jobs
+                url = search_page_url(config, query, i)
+                soup = get_with_retry(url, config, session=session)
+                with REGISTRY.timer('parse_seconds', page='search'):
+                    jobs = transform(soup)
+                all_jobs.extend(jobs)
                 print("Finished scraping page: ", url)
+    return filter_jobcards(all_jobs, config)
+
+def filter_jobcards(all_jobs, config):
+    # Dedupe and filter the scraped job cards before anything is compared to the database
     print ("Total job cards scraped: ", len(all_jobs))
     all_jobs = remove_duplicates(all_jobs, config)
     print ("Total job cards after removing duplicates: ", len(all_jobs))
@@ -363,140 +469,80 @@ def get_jobcards(config):
 
 def find_new_jobs(all_jobs, conn, config):
     # From all_jobs, find the jobs that are not already in the database. Function checks both the jobs and filtered_jobs tables.
+    # Only the key columns are read and kept in sets, so each lookup is O(1) instead of a scan of the whole table.
     jobs_tablename = config['jobs_tablename']
     filtered_jobs_tablename = config['filtered_jobs_tablename']
-    jobs_db = pd.DataFrame()
-    filtered_jobs_db = pd.DataFrame()    
+    jobs_db = (set(), set())
+    filtered_jobs_db = (set(), set())
     if conn is not None:
         if table_exists(conn, jobs_tablename):
-            query = f"SELECT * FROM {jobs_tablename}"
-            jobs_db = pd.read_sql_query(query, conn)
+            jobs_db = existing_job_keys(conn, jobs_tablename)
         if table_exists(conn, filtered_jobs_tablename):
-            query = f"SELECT * FROM {filtered_jobs_tablename}"
-            filtered_jobs_db = pd.read_sql_query(query, conn)
+            filtered_jobs_db = existing_job_keys(conn, filtered_jobs_tablename)
 
     new_joblist = [job for job in all_jobs if not job_exists(jobs_db, job) and not job_exists(filtered_jobs_db, job)]
     return new_joblist
 
-def send_mail(joblist):
-    if not joblist:
-        plain_text = "No new jobs found today."
-        html_content = "<p>No new jobs found today.</p>"
-    else:
-        groups = defaultdict(list)
-        for job in joblist:
-            domain = ''
-            if 'linkedin.com' in job['job_url']:
-                domain = 'LinkedIn'
-            elif 'google.com' in job['job_url']:
-                domain = 'Google Careers'
-            elif 'apple.com' in job['job_url']:
-                domain = 'Apple Careers'
-            elif 'nvidia.com' in job['job_url'] or 'nvidia.wd5.myworkdayjobs.com' in job['job_url']:
-                domain = 'NVIDIA Careers'
-            else:
-                domain = job.get('company', 'Other')
-            groups[domain].append(job)
-
-        plain_text = f"{sum(len(jobs) for jobs in groups.values())} new job(s) found:\n\n"
-        html_content = f"<h2>{sum(len(jobs) for jobs in groups.values())} New Job(s) Found</h2>"
-
-        for source, jobs in groups.items():
-            # Sort the jobs by date (newest first)
-            jobs.sort(key=lambda x: x['date'], reverse=True)
-
-            plain_text += f"== {source} ({len(jobs)} job(s)) ==\n"
-            html_content += f"<h3>{source} ({len(jobs)} job{'s' if len(jobs) > 1 else ''})</h3><ul>"
-
-            for i, job in enumerate(jobs, 1):
-                plain_text += (
-                    f"{i}. {job['title']} at {job['company']}\n"
-                    f"   Location: {job['location']}\n"
-                    f"   Date: {job['date']}\n"
-                    f"   Link: {job['job_url']}\n\n"
-                )
-                html_content += (
-                    f"<li><strong>{job['title']}</strong> at {job['company']}<br>"
-                    f"<em>{job['location']} – {job['date']}</em><br>"
-                    f"<a href='{job['job_url']}'>View Job</a></li><br>"
-                )
-
-            html_content += "</ul>"
-
-    # Create email
-    msg = EmailMessage()
-    msg['Subject'] = f"Job Scraper – {len(joblist)} New Jobs"
-    fromMail = os.getenv("GMAIL_EMAIL")
-    toMail = os.getenv("RECIPIENT_EMAIL")
-    msg['From'] = fromMail
-    msg['To'] = toMail
-
-    msg.set_content(plain_text)  # fallback for non-HTML clients
-    msg.add_alternative(f"""\
-    <html>
-        <body>
-            {html_content}
-        </body>
-    </html>
-    """, subtype='html')
-
-    with smtplib.SMTP(host="smtp.gmail.com", port="587") as smtp:  # 設定SMTP伺服器
-        try:
-            smtp.ehlo()  # 驗證SMTP伺服器
-            smtp.starttls()  # 建立加密傳輸
-
-            email = os.getenv("GMAIL_EMAIL")
+def is_recent(job, config):
+    # Whether the job was posted within the last days_to_scrape days
+    job_date = convert_date_format(job['date'])
+    job_date = datetime.combine(job_date, time())
+    return job_date >= datetime.now() - timedelta(days=config['days_to_scrape'])
 
-            password = os.getenv("GMAIL_PASSWORD")
-
-            if not password or not email:
-                raise ValueError("GMAIL_PASSWORD env variable not set")
-
-            smtp.login(email, password)  # 登入寄件者gmail
-            smtp.send_message(msg)  # 寄送郵件
-            print("Complete send mail!")
-        except Exception as e:
-            print("Error message: ", e)
+def process_jobs(all_jobs, conn, config, session=None, desc_cache=None):
+    # Everything after scraping the job cards: compare to the database, fetch descriptions, filter and store.
+    # desc_cache (job_url -> description) holds descriptions fetched elsewhere, e.g. by the distributed crawl's workers.
+    import pandas as pd
 
-def main(config_file):
-    start_time = tm.perf_counter()
     job_list = []
-
-    config = load_config(config_file)
     jobs_tablename = config['jobs_tablename'] # name of the table to store the "approved" jobs
     filtered_jobs_tablename = config['filtered_jobs_tablename'] # name of the table to store the jobs that have been filtered out based on description keywords (so that in future they are not scraped again)
-    #Scrape search results page and get job cards. This step might take a while based on the number of pages and search queries.
-    all_jobs = get_jobcards(config)
 
-    google_jobs = get_google_jobs()
-    all_jobs += google_jobs
-
-    conn = create_connection(config)
     #filtering out jobs that are already in the database
-    all_jobs = find_new_jobs(all_jobs, conn, config)
+    with REGISTRY.span('find_new_jobs'):
+        all_jobs = find_new_jobs(all_jobs, conn, config)
     print ("Total new jobs found after comparing to the database: ", len(all_jobs))
-    send_mail(all_jobs)
 
     if len(all_jobs) > 0:
 
-        for job in all_jobs:
-            job_date = convert_date_format(job['date'])
-            job_date = datetime.combine(job_date, time())
-            #if job is older than a week, skip it
-            if job_date < datetime.now() - timedelta(days=config['days_to_scrape']):
-                continue
-            print('Found new job: ', job['title'], 'at ', job['company'], job['job_url'])
-            desc_soup = get_with_retry(job['job_url'], config)
-            job['job_description'] = transform_job(desc_soup)
-            language = safe_detect(job['job_description'])
-            if language not in config['languages']:
-                print('Job description language not supported: ', language)
-                #continue
-            job_list.append(job)
+        #Rank the recent cards, descriptions are only fetched for the best ones, see ranking.py
+        with REGISTRY.span('rank_cards'):
+            recent_jobs = [job for job in all_jobs if is_recent(job, config)]
+            jobs_to_fetch, below_threshold, over_budget = select_for_descriptions(recent_jobs, config)
+            REGISTRY.inc('ranked_cards_total', len(jobs_to_fetch), result='fetch')
+            REGISTRY.inc('ranked_cards_total', len(below_threshold), result='below_threshold')
+            REGISTRY.inc('ranked_cards_total', len(over_budget), result='over_budget')
+        print(f"Fetching {len(jobs_to_fetch)} description(s), {len(below_threshold)} job(s) scored below min_score, {len(over_budget)} left for the next run")
+
+        with REGISTRY.span('fetch_descriptions'):
+            for job in jobs_to_fetch:
+                print('Found new job: ', job['title'], 'at ', job['company'], job['job_url'])
+                if desc_cache is not None and job['job_url'] in desc_cache:
+                    REGISTRY.inc('desc_cache_requests_total', result='hit')
+                    job['job_description'] = desc_cache[job['job_url']]
+                else:
+                    if desc_cache is not None:
+                        REGISTRY.inc('desc_cache_requests_total', result='miss')
+                    desc_soup = get_with_retry(job['job_url'], config, session=session)
+                    with REGISTRY.timer('parse_seconds', page='description'):
+                        job['job_description'] = transform_job(desc_soup)
+                    if desc_cache is not None:
+                        desc_cache[job['job_url']] = job['job_description']
+                language = safe_detect(job['job_description'])
+                if language not in config['languages']:
+                    print('Job description language not supported: ', language)
+                    #continue
+                job_list.append(job)
+        #Re-rank with the descriptions, so the best matches are stored and mailed first
+        with REGISTRY.span('rank_descriptions'):
+            rank_jobs(job_list, config, with_description=True)
         #Final check - removing jobs based on job description keywords words from the config file
-        jobs_to_add = remove_irrelevant_jobs(job_list, config)
+        with REGISTRY.span('filter_descriptions'):
+            jobs_to_add = remove_irrelevant_jobs(job_list, config)
         print ("Total jobs to add: ", len(jobs_to_add))
-        #Create a list for jobs removed based on job description keywords - they will be added to the filtered_jobs table
+        #Create a list for jobs removed based on job description keywords - they will be added to the filtered_jobs table.
+        #Cards that scored below min_score are not stored, like the ones over the budget: a later run with a lower
+        #min_score or a broader query still finds them.
         filtered_list = [job for job in job_list if job not in jobs_to_add]
         df = pd.DataFrame(jobs_to_add)
         df_filtered = pd.DataFrame(filtered_list)
@@ -505,30 +551,67 @@ def main(config_file):
         df['date_loaded'] = df['date_loaded'].astype(str)
         df_filtered['date_loaded'] = df_filtered['date_loaded'].astype(str)
         if conn is not None:
-            #Update or Create the database table for the job list
-            if table_exists(conn, jobs_tablename):
-                update_table(conn, df, jobs_tablename)
-            else:
-                create_table(conn, df, jobs_tablename)
-                
-            #Update or Create the database table for the filtered out jobs
-            if table_exists(conn, filtered_jobs_tablename):
-                update_table(conn, df_filtered, filtered_jobs_tablename)
-            else:
-                create_table(conn, df_filtered, filtered_jobs_tablename)
+            with REGISTRY.span('db_write'):
+                #Update or Create the database tables for the job list and for the filtered out jobs
+                store_jobs(conn, df, jobs_tablename, row_versions=True)
+                store_jobs(conn, df_filtered, filtered_jobs_tablename)
+            #Append the new rows to the Parquet archive instead of rewriting a CSV of the whole run
+            if config.get('archive_dir'):
+                with REGISTRY.span('export_parquet'):
+                    export_parquet(conn, config)
         else:
             print("Error! cannot create the database connection.")
-        
-        df.to_csv('linkedin_jobs.csv', index=False, encoding='utf-8')
-        df_filtered.to_csv('linkedin_jobs_filtered.csv', index=False, encoding='utf-8')
+
+        #Mail the jobs that were added, now that their descriptions are known, and the stored ones an earlier
+        #digest failed to deliver. Without the database the digest is still sent, only the sent jobs ledger is skipped.
+        with REGISTRY.span('send_digest'):
+            send_digest(jobs_to_add, conn, config)
     else:
         print("No jobs found")
+
+def main(config_file):
+    start_time = tm.perf_counter()
+
+    config = load_config(config_file)
+    with REGISTRY.span('run'):
+        #Scrape search results page and get job cards. This step might take a while based on the number of pages and search queries.
+        with REGISTRY.span('get_jobcards'):
+            all_jobs = get_jobcards(config)
+
+        with REGISTRY.span('google_jobs'):
+            google_jobs = get_google_jobs()
+        all_jobs += google_jobs
+
+        conn = create_connection(config)
+        process_jobs(all_jobs, conn, config)
     
     end_time = tm.perf_counter()
     print(f"Scraping finished in {end_time - start_time:.2f} seconds")
+    # Per-stage timings, fetch/parse/filter/DB metrics for this run
+    write_reports(config)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape job boards and store new jobs in the database.")
+    parser.add_argument("--daemon", action="store_true", help="keep running and re-scrape each query/source on its own interval")
+    parser.add_argument("--coordinator", action="store_true", help="split the crawl into units on the shared work queue and process the results")
+    parser.add_argument("--worker", action="store_true", help="claim and fetch units from the shared work queue")
+    parser.add_argument("--compact", action="store_true", help="delete old filtered jobs, retrain the compression dictionary and VACUUM the database")
+    parser.add_argument("--config", help="config file to use (default: config.json next to this script)")
+    args = parser.parse_args()
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    config_file = os.path.join(script_dir, "config.json")
-    main(config_file)
+    config_file = args.config or os.path.join(script_dir, "config.json")
+    if args.daemon:
+        from daemon import run_daemon
+        run_daemon(config_file)
+    elif args.coordinator:
+        from workqueue import run_coordinator
+        run_coordinator(config_file)
+    elif args.worker:
+        from workqueue import run_worker
+        run_worker(config_file)
+    elif args.compact:
+        compact(load_config(config_file))
+    else:
+        main(config_file)
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time as tm
+from contextlib import contextmanager
+from datetime import datetime
+
+# Histogram buckets in seconds, the same defaults the Prometheus client libraries use
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'min': self.min,
+            'max': self.max,
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'buckets': {str(bound): n for bound, n in zip(self.buckets, self.bucket_counts)},
+        }
+
+class Metrics:
+    # Counters, histograms and trace spans for one process. Metric names are exported with the namespace prefix.
+    def __init__(self, namespace='jobscraper'):
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.counters = {}
+        self.histograms = {}
+        self.spans = []
+        self.started = tm.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        # Observe the duration of the block in the `name` histogram
+        start = tm.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, tm.perf_counter() - start, **labels)
+
+    @contextmanager
+    def span(self, name, **labels):
+        # Record a trace span for the block. Spans opened inside it on the same thread become its children.
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        parent = stack[-1] if stack else None
+        span = {'name': name, 'parent': parent['name'] if parent else None, 'labels': labels,
+                'start': round(tm.time() - self.started, 6)}
+        stack.append(span)
+        start = tm.perf_counter()
+        try:
+            yield span
+        finally:
+            span['seconds'] = round(tm.perf_counter() - start, 6)
+            stack.pop()
+            self.observe('stage_seconds', span['seconds'], stage=name)
+            with self.lock:
+                self.spans.append(span)
+
+    def reset_spans(self):
+        # Keep the cumulative counters/histograms but start a fresh trace, e.g. for each daemon cycle
+        with self.lock:
+            self.spans = []
+            self.started = tm.time()
+
+    def report(self):
+        with self.lock:
+            return {
+                'generated_at': datetime.now().isoformat(timespec='seconds'),
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), **histogram.to_dict()}
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+                'spans': list(self.spans),
+            }
+
+    def to_prometheus(self):
+        # Render everything in the Prometheus text exposition format
+        lines = []
+        with self.lock:
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                full_name = f"{self.namespace}_{name}"
+                if full_name not in seen:
+                    seen.add(full_name)
+                    lines.append(f"# TYPE {full_name} counter")
+                lines.append(f"{full_name}{prometheus_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                full_name = f"{self.namespace}_{name}"
+                if full_name not in seen:
+                    seen.add(full_name)
+                    lines.append(f"# TYPE {full_name} histogram")
+                for bound, n in zip(histogram.buckets, histogram.bucket_counts):
+                    lines.append(f"{full_name}_bucket{prometheus_labels(labels + (('le', bound),))} {n}")
+                lines.append(f"{full_name}_bucket{prometheus_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{full_name}_sum{prometheus_labels(labels)} {histogram.sum}")
+                lines.append(f"{full_name}_count{prometheus_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        write_file(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, path):
+        write_file(path, self.to_prometheus())
+
+def prometheus_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+def write_file(path, text):
+    # Write through a temporary file so readers (e.g. the Flask /metrics route) never see a partial file
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def write_reports(config, registry=None):
+    # Export the run report and the Prometheus text file to the paths set in config.json
+    registry = registry or REGISTRY
+    try:
+        registry.write_json(config.get('metrics_json_path', './data/run_report.json'))
+        registry.write_prometheus(config.get('metrics_prom_path', './data/metrics.prom'))
+    except OSError as e:
+        print("Error writing metrics: ", e)
+
+# Registry shared by the scraper modules
+REGISTRY = Metrics()
@@ -0,0 +1,147 @@
+import os
+import re
+from collections import Counter
+
+from metrics import REGISTRY
+
+# Jobs are scored against what the config is looking for: the search keywords and title_include words
+# (phrases), and the most frequent terms of the resume. Cards are scored first, on title and company, to
+# decide which descriptions are worth fetching. Fetched jobs are then scored again with their description.
+#
+#     score = title coverage + keyword match                (0 to 2)
+#
+# Title coverage is the largest fraction of one phrase's words found in the card, e.g. 1.0 for
+# "Senior Product Designer" and the phrase "product designer", 0.5 for "Visual Designer".
+# Keyword match is the weighted share of all query terms found in the text, with BM25's term frequency
+# saturation so a term repeated many times doesn't dominate.
+# Neither part depends on the other jobs being scored (there is no IDF), so a score means the same
+# in every run and min_score is a fixed bar, and the stored scores can be compared across runs.
+
+DEFAULT_RANKING_CONFIG = {
+    "min_score": 0.0,             # cards scoring below this are skipped without fetching the description
+    "description_budget": None,   # most descriptions fetched per run, the best cards first. The rest wait for the next run.
+    "resume_weight": 0.3,         # weight of the resume terms relative to the search keywords
+    "resume_terms": 30,           # how many of the resume's most frequent terms are added to the query
+}
+
+BM25_K1 = 1.2
+
+STOPWORDS = {
+    'a', 'about', 'all', 'also', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'been', 'by', 'can', 'for', 'from', 'has',
+    'have', 'in', 'into', 'is', 'it', 'its', 'may', 'more', 'my', 'new', 'not', 'of', 'on', 'or', 'our', 'over', 'such',
+    'that', 'the', 'their', 'this', 'to', 'was', 'we', 'were', 'which', 'will', 'with', 'you', 'your',
+}
+
+# (path, mtime) -> resume text, so a long-running process reads the PDF once
+_resume_cache = {}
+
+def ranking_config(config):
+    # The optional "ranking" section of config.json, filled in with defaults
+    settings = dict(DEFAULT_RANKING_CONFIG)
+    settings.update(config.get('ranking', {}))
+    return settings
+
+def tokenize(text):
+    return re.findall(r'[a-z0-9]+', (text or '').lower())
+
+def read_resume(path):
+    # Text of the resume at resume_path (PDF or plain text), or '' if it can't be read
+    if not path or not os.path.isfile(path):
+        return ''
+    key = (path, os.path.getmtime(path))
+    if key not in _resume_cache:
+        try:
+            if path.lower().endswith('.pdf'):
+                from pdfminer.high_level import extract_text
+                _resume_cache[key] = extract_text(path)
+            else:
+                with open(path, encoding='utf-8') as f:
+                    _resume_cache[key] = f.read()
+        except Exception as e:
+            print(f"Could not read the resume for ranking: {e}")
+            _resume_cache[key] = ''
+    return _resume_cache[key]
+
+def build_query(config):
+    # Returns (phrases, terms): the search keywords and title_include words as tuples of words, and
+    # query term -> weight. Phrase words weigh 1, resume terms up to resume_weight.
+    settings = ranking_config(config)
+    phrases = []
+    terms = {}
+    for text in [q['keywords'] for q in config.get('search_queries', [])] + config.get('title_include', []):
+        phrase = tuple(tokenize(text))
+        if phrase and phrase not in phrases:
+            phrases.append(phrase)
+        for term in phrase:
+            terms[term] = 1.0
+    resume_counts = Counter(t for t in tokenize(read_resume(config.get('resume_path'))) if len(t) > 2 and t not in STOPWORDS)
+    if resume_counts:
+        top = resume_counts.most_common(settings['resume_terms'])
+        most = top[0][1]
+        for term, count in top:
+            terms.setdefault(term, settings['resume_weight'] * count / most)
+    return phrases, terms
+
+def term_counts(docs, index):
+    # Documents x query terms matrix of term counts. Only the query terms are counted,
+    # so the matrix stays small however large the vocabulary is.
+    import numpy as np
+
+    tf = np.zeros((len(docs), len(index)))
+    for d, doc in enumerate(docs):
+        for token in tokenize(doc):
+            i = index.get(token)
+            if i is not None:
+                tf[d, i] += 1
+    return tf
+
+def title_coverage(docs, phrases):
+    # For every document, the largest fraction of one phrase's words it contains
+    import numpy as np
+
+    if not docs or not phrases:
+        return [0.0] * len(docs)
+    index = {}
+    for phrase in phrases:
+        for term in phrase:
+            index.setdefault(term, len(index))
+    present = term_counts(docs, index) > 0
+    coverage = np.column_stack([present[:, [index[term] for term in phrase]].mean(axis=1) for phrase in phrases])
+    return coverage.max(axis=1).tolist()
+
+def keyword_match(docs, terms):
+    # For every document, the weighted share of the query terms it contains, each saturated like in BM25
+    import numpy as np
+
+    if not docs or not terms:
+        return [0.0] * len(docs)
+    index = {term: i for i, term in enumerate(terms)}
+    tf = term_counts(docs, index)
+    weights = np.array([terms[term] for term in index])
+    return ((tf / (tf + BM25_K1)) @ weights / weights.sum()).tolist()
+
+def card_text(job):
+    return f"{job['title']} {job['company']}"
+
+def rank_jobs(joblist, config, with_description=False):
+    # Set job['score'] and sort the list best first
+    phrases, terms = build_query(config)
+    cards = [card_text(job) for job in joblist]
+    texts = [f"{card} {job.get('job_description') or ''}" for card, job in zip(cards, joblist)] if with_description else cards
+    with REGISTRY.timer('rank_seconds', stage='description' if with_description else 'card'):
+        scores = [coverage + match for coverage, match in zip(title_coverage(cards, phrases), keyword_match(texts, terms))]
+    for job, score in zip(joblist, scores):
+        job['score'] = round(score, 4)
+    joblist.sort(key=lambda job: job['score'], reverse=True)
+    return joblist
+
+def select_for_descriptions(joblist, config):
+    # Rank the cards and split them into (fetch, below_threshold, over_budget)
+    settings = ranking_config(config)
+    rank_jobs(joblist, config)
+    fetch, below_threshold, over_budget = [], [], []
+    for job in joblist:
+        (fetch if job['score'] >= settings['min_score'] else below_threshold).append(job)
+    if settings['description_budget'] is not None:
+        fetch, over_budget = fetch[:settings['description_budget']], fetch[settings['description_budget']:]
+    return fetch, below_threshold, over_budget
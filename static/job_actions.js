@@ -152,6 +152,76 @@ function markAsInterview(jobId) {
         });
 }
 
+function jobItemClass(job) {
+    // Same classes the jobs.html template gives a job card
+    if (job.rejected == 1) return 'job-item job-item-rejected';
+    if (job.interview == 1) return 'job-item job-item-interview';
+    if (job.applied == 1) return 'job-item job-item-applied';
+    return 'job-item';
+}
+
+function createJobItem(job) {
+    var jobCard = document.createElement('a');
+    jobCard.href = '#';
+    jobCard.setAttribute('data-job-id', job.id);
+    jobCard.setAttribute('data-score', job.score || 0);
+    jobCard.onclick = function(event) { event.preventDefault(); showJobDetails(job.id); };
+    var content = document.createElement('div');
+    content.className = 'job-content';
+    var title = document.createElement('h3');
+    title.textContent = job.title;
+    var companyLocation = document.createElement('p');
+    companyLocation.textContent = job.company + ', ' + job.location;
+    var date = document.createElement('p');
+    date.textContent = job.date;
+    content.append(title, companyLocation, date);
+    jobCard.appendChild(content);
+    return jobCard;
+}
+
+function applyJobEvent(job) {
+    // Patch one job card in the list: insert it, update its status classes, or remove it once hidden
+    var jobCard = document.querySelector(`.job-item[data-job-id="${job.id}"]`);
+    if (job.hidden == 1) {
+        if (jobCard) {
+            if (jobCard === selectedJob) {
+                selectedJob = null;
+                document.getElementById('job-details').innerHTML = '';
+            }
+            jobCard.remove();
+        }
+        return;
+    }
+    if (!jobCard) {
+        jobCard = createJobItem(job);
+        // The list is ordered by score, best first, then by id, newest first
+        var score = job.score || 0;
+        var next = Array.from(document.querySelectorAll('.job-item')).find(function(item) {
+            var itemScore = Number(item.getAttribute('data-score'));
+            return itemScore < score || (itemScore == score && Number(item.getAttribute('data-job-id')) < job.id);
+        });
+        document.getElementById('job-list').insertBefore(jobCard, next || null);
+    }
+    var selected = jobCard === selectedJob;
+    jobCard.className = jobItemClass(job);
+    if (selected) {
+        jobCard.classList.add('job-item-selected');
+    }
+}
+
+function listenForJobEvents() {
+    // New and changed jobs arrive over Server-Sent Events instead of reloading the page.
+    // The browser reconnects on its own and resumes from the last event id it received.
+    var jobList = document.getElementById('job-list');
+    var since = jobList.getAttribute('data-row-version') || 0;
+    var source = new EventSource('/events?since=' + since);
+    source.addEventListener('job', function(event) {
+        applyJobEvent(JSON.parse(event.data));
+    });
+}
+
+listenForJobEvents();
+
 var resizer = document.getElementById('resizer');
 var jobDetails = document.getElementById('job-details');
 var bottomPane = document.getElementById('bottom-pane');
@@ -0,0 +1,274 @@
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from metrics import REGISTRY
+
+# Long text columns are stored as zstd frames. A dictionary trained on earlier descriptions is shared by all
+# rows, which is what makes compressing a few KB of text per row worthwhile. Rows written before compression
+# was added are still plain text and are returned unchanged.
+BLOB_COLUMNS = ['job_description', 'resume', 'cover_letter']
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+COMPRESSION_LEVEL = 10
+DICT_SIZE = 64 * 1024
+
+DEFAULT_RETENTION_CONFIG = {
+    "filtered_jobs_days": 30,   # filtered out jobs older than this are deleted by --compact
+    "dict_samples": 2000,       # descriptions sampled to train the dictionary
+}
+
+# dict_id -> zstandard.ZstdCompressionDict, loaded from the database on first use
+_dicts = {}
+
+def ensure_dict_table(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS zstd_dicts (dict_id INTEGER PRIMARY KEY, data BLOB NOT NULL, created_at TEXT)")
+
+def load_dict(conn, dict_id):
+    import zstandard
+
+    if dict_id not in _dicts:
+        ensure_dict_table(conn)
+        row = conn.execute("SELECT data FROM zstd_dicts WHERE dict_id = ?", (dict_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"zstd dictionary {dict_id} not found in the database")
+        _dicts[dict_id] = zstandard.ZstdCompressionDict(row[0])
+    return _dicts[dict_id]
+
+def latest_dict(conn):
+    # The most recently trained dictionary, or None before the first compaction
+    ensure_dict_table(conn)
+    row = conn.execute("SELECT dict_id FROM zstd_dicts ORDER BY created_at DESC, rowid DESC LIMIT 1").fetchone()
+    return load_dict(conn, row[0]) if row else None
+
+def compressor(conn):
+    import zstandard
+
+    dictionary = latest_dict(conn)
+    if dictionary is None:
+        return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+    return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dictionary)
+
+def compress_text(value, cctx):
+    # Compress a text value with the given compressor; empty values, None and existing blobs pass through
+    if not isinstance(value, str) or not value:
+        return value
+    blob = cctx.compress(value.encode('utf-8'))
+    REGISTRY.inc('blob_bytes_total', len(value.encode('utf-8')), state='plain')
+    REGISTRY.inc('blob_bytes_total', len(blob), state='compressed')
+    return blob
+
+def is_compressed(value):
+    return isinstance(value, bytes) and value.startswith(ZSTD_MAGIC)
+
+def decompress_text(value, conn):
+    # Inverse of compress_text. Plain text from older rows is returned as is.
+    if not is_compressed(value):
+        return value
+    import zstandard
+
+    dict_id = zstandard.get_frame_parameters(value).dict_id
+    if dict_id:
+        dctx = zstandard.ZstdDecompressor(dict_data=load_dict(conn, dict_id))
+    else:
+        dctx = zstandard.ZstdDecompressor()
+    return dctx.decompress(value).decode('utf-8')
+
+def compress_df(df, conn):
+    # Compress the blob columns of a DataFrame that is about to be written to the database
+    cctx = compressor(conn)
+    for column in BLOB_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(object).map(lambda value: compress_text(value, cctx))
+    return df
+
+def decompress_row(row, conn):
+    # Decompress the blob columns of a row dictionary read from the database
+    for column in BLOB_COLUMNS:
+        if column in row:
+            row[column] = decompress_text(row[column], conn)
+    return row
+
+def table_columns(conn, table_name):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+def train_dict(conn, tables, samples):
+    # Train a new shared dictionary from a random sample of the stored text. Returns its id, or None.
+    import zstandard
+
+    texts = []
+    for table in tables:
+        columns = [c for c in BLOB_COLUMNS if c in table_columns(conn, table)]
+        for column in columns:
+            for (value,) in conn.execute(f'SELECT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL'):
+                text = decompress_text(value, conn)
+                if text:
+                    texts.append(text.encode('utf-8'))
+    if len(texts) > samples:
+        texts = random.sample(texts, samples)
+    try:
+        dictionary = zstandard.train_dictionary(DICT_SIZE, texts)
+    except zstandard.ZstdError as e:
+        print(f"Not enough text to train a compression dictionary ({len(texts)} samples): {e}")
+        return None
+    dict_id = dictionary.dict_id()
+    ensure_dict_table(conn)
+    conn.execute("INSERT OR REPLACE INTO zstd_dicts (dict_id, data, created_at) VALUES (?, ?, ?)",
+                 (dict_id, dictionary.as_bytes(), datetime.now().isoformat()))
+    conn.commit()
+    _dicts[dict_id] = dictionary
+    print(f"Trained compression dictionary {dict_id} from {len(texts)} samples")
+    return dict_id
+
+def recompress_table(conn, table_name):
+    # Re-encode every blob in the table with the latest dictionary. Returns the number of values rewritten.
+    cctx = compressor(conn)
+    columns = [c for c in BLOB_COLUMNS if c in table_columns(conn, table_name)]
+    rewritten = 0
+    for column in columns:
+        rows = conn.execute(f'SELECT id, "{column}" FROM "{table_name}" WHERE "{column}" IS NOT NULL').fetchall()
+        for row_id, value in rows:
+            text = decompress_text(value, conn)
+            if not text:
+                continue
+            conn.execute(f'UPDATE "{table_name}" SET "{column}" = ? WHERE id = ?', (compress_text(text, cctx), row_id))
+            rewritten += 1
+    conn.commit()
+    return rewritten
+
+def compact(config):
+    # Retention and compaction: drop old filtered jobs, retrain the dictionary, recompress and VACUUM
+    settings = dict(DEFAULT_RETENTION_CONFIG)
+    settings.update(config.get('retention', {}))
+    jobs_tablename = config['jobs_tablename']
+    filtered_jobs_tablename = config['filtered_jobs_tablename']
+    conn = sqlite3.connect(config['db_path'])
+    tables = [t for t in (jobs_tablename, filtered_jobs_tablename) if table_columns(conn, t)]
+    size_before = os.path.getsize(config['db_path'])
+
+    if filtered_jobs_tablename in tables and 'date_loaded' in table_columns(conn, filtered_jobs_tablename):
+        cutoff = str(datetime.now() - timedelta(days=settings['filtered_jobs_days']))
+        cur = conn.execute(f'DELETE FROM "{filtered_jobs_tablename}" WHERE date_loaded < ?', (cutoff,))
+        conn.commit()
+        print(f"Deleted {cur.rowcount} filtered jobs loaded before {cutoff[:10]}")
+
+    if train_dict(conn, tables, settings['dict_samples']) is not None:
+        for table in tables:
+            print(f"Recompressed {recompress_table(conn, table)} value(s) in the {table} table")
+
+    conn.execute("VACUUM")
+    conn.close()
+    size_after = os.path.getsize(config['db_path'])
+    print(f"Database size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+
+def parquet_type(declared):
+    # Arrow type for a column's declared SQLite type, following SQLite's type affinity rules
+    import pyarrow as pa
+
+    declared = (declared or '').upper()
+    if 'INT' in declared:
+        return pa.int64()
+    if any(name in declared for name in ('CHAR', 'CLOB', 'TEXT')):
+        return pa.string()
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    if 'BLOB' in declared:
+        return pa.binary()
+    return pa.string()  # TIMESTAMP, or no declared type
+
+def parquet_schema(conn, table_name):
+    # The archive schema of a table, from its current columns. Compressed text columns are archived as text.
+    import pyarrow as pa
+
+    return pa.schema([(name, pa.string() if name in BLOB_COLUMNS else parquet_type(declared))
+                      for _, name, declared, *_ in conn.execute(f'PRAGMA table_info("{table_name}")')])
+
+def parquet_value(value, arrow_type):
+    # SQLite doesn't enforce column types, so convert each value to the column's archive type
+    import pyarrow as pa
+
+    if value is None:
+        return None
+    if pa.types.is_integer(arrow_type):
+        return int(value)
+    if pa.types.is_floating(arrow_type):
+        return float(value)
+    if pa.types.is_binary(arrow_type):
+        return value if isinstance(value, bytes) else str(value).encode('utf-8')
+    return value.decode('utf-8', errors='replace') if isinstance(value, bytes) else str(value)
+
+def export_parquet(conn, config):
+    # Append rows added since the last export to a Parquet archive partitioned by the date they were loaded:
+    #     <archive_dir>/<table>/load_date=YYYY-MM-DD/part-<first id>-<last id>.parquet
+    # (the partition key is named load_date so it does not clash with the full date_loaded timestamp column)
+    # Only new rows are exported, later status changes (applied, hidden, ...) stay in the database.
+    # Every part is written with the table's schema, so a column that is NULL in every row of a part keeps its type.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    archive_dir = config['archive_dir']
+    conn.execute("CREATE TABLE IF NOT EXISTS export_state (table_name TEXT PRIMARY KEY, last_id INTEGER NOT NULL)")
+    for table in (config['jobs_tablename'], config['filtered_jobs_tablename']):
+        columns = table_columns(conn, table)
+        if 'id' not in columns or 'date_loaded' not in columns:
+            continue
+        row = conn.execute("SELECT last_id FROM export_state WHERE table_name = ?", (table,)).fetchone()
+        last_id = row[0] if row else 0
+        cur = conn.execute(f'SELECT * FROM "{table}" WHERE id > ? ORDER BY id', (last_id,))
+        names = [c[0] for c in cur.description]
+        rows = [decompress_row(dict(zip(names, values)), conn) for values in cur.fetchall()]
+        if not rows:
+            continue
+
+        schema = parquet_schema(conn, table)
+        partitions = {}
+        for r in rows:
+            partitions.setdefault(str(r['date_loaded'])[:10], []).append(r)
+        for day, part in partitions.items():
+            directory = os.path.join(archive_dir, table, f"load_date={day}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{part[0]['id']}-{part[-1]['id']}.parquet")
+            records = [{field.name: parquet_value(r.get(field.name), field.type) for field in schema} for r in part]
+            pq.write_table(pa.Table.from_pylist(records, schema=schema), path, compression='zstd')
+
+        conn.execute("INSERT OR REPLACE INTO export_state (table_name, last_id) VALUES (?, ?)", (table, rows[-1]['id']))
+        conn.commit()
+        print(f"Exported {len(rows)} row(s) from the {table} table to {archive_dir}")
+
+def read_archive(conn, config, table_name):
+    # Read a table's whole Parquet archive with the table's current schema. Parts written before a column
+    # was added (e.g. score) get NULLs for it. Without the schema pyarrow would go by one part and drop it.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(conn, table_name).append(pa.field('load_date', pa.string()))
+    return pq.read_table(os.path.join(config['archive_dir'], table_name), schema=schema, partitioning='hive')
+
+# Columns whose changes are pushed to the app's /events stream, besides newly inserted rows
+VERSIONED_COLUMNS = ['applied', 'interview', 'rejected', 'hidden']
+
+def ensure_row_versions(conn, table_name):
+    # Give every row a row_version that increases whenever a row is inserted or its status changes.
+    # The triggers keep it up to date for the scraper and the app alike, whichever process writes.
+    columns = table_columns(conn, table_name)
+    if not columns:
+        return
+    conn.execute("CREATE TABLE IF NOT EXISTS row_versions (table_name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    if 'row_version' not in columns:
+        conn.execute(f'ALTER TABLE "{table_name}" ADD COLUMN row_version INTEGER')
+        # Existing rows are numbered in insertion order
+        conn.execute(f'UPDATE "{table_name}" SET row_version = rowid')
+        conn.execute(f'INSERT OR REPLACE INTO row_versions (table_name, version) SELECT ?, coalesce(max(rowid), 0) FROM "{table_name}"',
+                     (table_name,))
+        print(f"Added row_version column to {table_name} table")
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "{table_name}_row_version" ON "{table_name}" (row_version)')
+
+    bump = f"""INSERT INTO row_versions (table_name, version) VALUES ('{table_name}', 1)
+                   ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+               UPDATE "{table_name}" SET row_version = (SELECT version FROM row_versions WHERE table_name = '{table_name}')
+                   WHERE rowid = NEW.rowid;"""
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS "{table_name}_row_version_insert" AFTER INSERT ON "{table_name}" BEGIN {bump} END')
+    watched = ', '.join(f'"{c}"' for c in VERSIONED_COLUMNS if c in columns)
+    if watched:
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS "{table_name}_row_version_update" AFTER UPDATE OF {watched} ON "{table_name}" BEGIN {bump} END')
+    conn.commit()
@@ -0,0 +1,13 @@
+from benchmarks.bench_pipeline import run_benchmarks
+
+
+def test_pipeline_benchmark_runs_offline():
+  report = run_benchmarks(sizes=[50], desc_sample=5)
+
+  stages = {result['stage'] for result in report['results']}
+  assert {'get_jobcards', 'transform', 'transform_job', 'remove_irrelevant_jobs[cards]',
+          'find_new_jobs', 'store_jobs[create]', 'store_jobs[update]'} <= stages
+
+  # Half of the candidates were already in the database
+  update = next(result for result in report['results'] if result['stage'] == 'store_jobs[update]')
+  assert update['items'] == 25
@@ -0,0 +1,39 @@
+from daemon import DaemonState, build_tasks, query_key, run_cycle, SOURCES
+
+
+def test_build_tasks_uses_query_and_source_intervals():
+  config = {
+    'search_queries': [
+      {'keywords': 'ux designer', 'location': 'United States', 'f_WT': '', 'interval': 600},
+      {'keywords': 'product designer', 'location': 'United States', 'f_WT': ''},
+    ],
+    'daemon': {'default_interval': 3600, 'sources': {'google': 7200, 'unknown': 60}},
+  }
+  tasks = build_tasks(config)
+
+  assert tasks[query_key(config['search_queries'][0])][0] == 600
+  assert tasks[query_key(config['search_queries'][1])][0] == 3600
+  assert tasks['google'] == (7200, 'source', 'google')
+  assert 'unknown' not in tasks
+
+
+def test_failed_source_drops_the_browser(monkeypatch):
+  class BrokenDriver:
+    quit_called = False
+
+    def quit(self):
+      BrokenDriver.quit_called = True
+
+  def broken_google(state):
+    state.get_driver()
+    raise RuntimeError("chrome not reachable")
+
+  state = DaemonState.__new__(DaemonState)
+  state.config, state.session, state.conn, state.driver = {}, None, None, BrokenDriver()
+  monkeypatch.setitem(SOURCES, 'google', broken_google)
+  monkeypatch.setattr('daemon.process_jobs', lambda *args, **kwargs: None)
+
+  run_cycle([(60, 'source', 'google')], state)
+
+  assert BrokenDriver.quit_called
+  assert state.driver is None
@@ -0,0 +1,134 @@
+import email
+from email import policy
+import socketserver
+import sqlite3
+import threading
+
+import pytest
+
+from digest import render_digest, send_digest
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+  # Just enough SMTP to accept messages from smtplib without TLS or login
+
+  def reply(self, line):
+    self.wfile.write(line.encode() + b'\r\n')
+
+  def handle(self):
+    self.server.connections += 1
+    self.reply('220 localhost stand-in')
+    while True:
+      line = self.rfile.readline()
+      if not line:
+        break
+      command = line[:4].upper()
+      if command == b'DATA':
+        self.reply('354 End data with <CR><LF>.<CR><LF>')
+        data = b''
+        while True:
+          chunk = self.rfile.readline()
+          if chunk == b'.\r\n':
+            break
+          data += chunk
+        self.server.messages.append(email.message_from_bytes(data, policy=policy.default))
+        self.reply('250 OK')
+      elif command == b'RCPT' and any(address.encode() in line for address in self.server.refused):
+        self.reply('550 No such user')
+      elif command == b'QUIT':
+        self.reply('221 Bye')
+        break
+      else:
+        self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server():
+  server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+  server.messages = []
+  server.connections = 0
+  server.refused = set()
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  yield server
+  server.shutdown()
+  server.server_close()
+
+
+def job(job_id, title, company='Acme'):
+  return {'title': title, 'company': company, 'location': 'Remote', 'date': '2026-10-18',
+          'job_url': f'https://www.linkedin.com/jobs/view/{job_id}/', 'job_description': 'Design <b>checkout</b> flows.'}
+
+
+def test_render_digest_escapes_html():
+  subject, plain_text, html_content = render_digest([job(1, 'Product Designer', company='A & B')])
+
+  assert subject == 'Job Scraper – 1 New Jobs'
+  assert '1. Product Designer at A & B' in plain_text
+  assert 'A &amp; B' in html_content
+  assert '&lt;b&gt;checkout&lt;/b&gt;' in html_content
+
+
+def test_send_digest_uses_one_session_and_mails_each_job_once(smtp_server):
+  conn = sqlite3.connect(':memory:')
+  config = {
+    'smtp': {'host': '127.0.0.1', 'port': smtp_server.server_address[1], 'starttls': False, 'login': False,
+             'sender': 'scraper@example.com'},
+    'subscriptions': [
+      {'email': 'ux@example.com', 'title_include': ['UX']},
+      {'email': 'all@example.com'},
+    ],
+  }
+  jobs = [job(1, 'UX Designer'), job(2, 'Product Designer')]
+
+  send_digest(jobs, conn, config)
+  assert smtp_server.connections == 1
+  assert sorted(msg['To'] for msg in smtp_server.messages) == ['all@example.com', 'ux@example.com']
+
+  # Nothing new: no connection is opened at all
+  send_digest(jobs, conn, config)
+  assert smtp_server.connections == 1
+
+  # Only the new job goes out
+  send_digest(jobs + [job(3, 'UX Researcher')], conn, config)
+  assert smtp_server.connections == 2
+  assert len(smtp_server.messages) == 4
+  assert 'UX Researcher' in smtp_server.messages[-1].get_body(('plain',)).get_content()
+  assert 'UX Designer' not in smtp_server.messages[-1].get_body(('plain',)).get_content()
+
+
+def test_send_digest_without_a_database_still_mails(smtp_server):
+  config = {
+    'smtp': {'host': '127.0.0.1', 'port': smtp_server.server_address[1], 'starttls': False, 'login': False,
+             'sender': 'scraper@example.com'},
+    'subscriptions': [{'email': 'all@example.com'}],
+  }
+  send_digest([job(1, 'UX Designer')], None, config)
+  assert [msg['To'] for msg in smtp_server.messages] == ['all@example.com']
+
+
+def test_a_failed_message_is_sent_on_the_next_call(smtp_server):
+  conn = sqlite3.connect(':memory:')
+  conn.execute("""CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, company TEXT, location TEXT, date TEXT,
+                  job_url TEXT, job_description TEXT, hidden INTEGER, date_loaded TEXT)""")
+  config = {
+    'jobs_tablename': 'jobs',
+    'days_to_scrape': 5,
+    'smtp': {'host': '127.0.0.1', 'port': smtp_server.server_address[1], 'starttls': False, 'login': False,
+             'sender': 'scraper@example.com'},
+    'subscriptions': [{'email': 'first@example.com'}, {'email': 'second@example.com'}],
+  }
+  # process_jobs stores the run's jobs before mailing them
+  jobs = [job(1, 'UX Designer')]
+  conn.execute("""INSERT INTO jobs (title, company, location, date, job_url, job_description, hidden, date_loaded)
+                  VALUES (:title, :company, :location, :date, :job_url, :job_description, 0, datetime('now', 'localtime'))""", jobs[0])
+
+  smtp_server.refused.add('first@example.com')
+  send_digest(jobs, conn, config)
+  assert [msg['To'] for msg in smtp_server.messages] == ['second@example.com']
+
+  # The next run found nothing new, the stored job still goes out to the first recipient only
+  smtp_server.refused.clear()
+  send_digest([], conn, config)
+  assert [msg['To'] for msg in smtp_server.messages] == ['second@example.com', 'first@example.com']
+  assert 'UX Designer' in smtp_server.messages[-1].get_body(('plain',)).get_content()
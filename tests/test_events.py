@@ -0,0 +1,80 @@
+import json
+import sqlite3
+
+import app as app_module
+from app import app, job_events
+from storage import compress_text, compressor, ensure_row_versions
+
+
+def insert_job(conn, title):
+  conn.execute("""INSERT INTO jobs (title, company, location, date, job_url, applied, interview, rejected, hidden)
+                  VALUES (?, 'Acme', 'Remote', '2026-10-18', ?, 0, 0, 0, 0)""", (title, f"https://example.com/{title}"))
+  conn.commit()
+
+
+def make_db(path):
+  conn = sqlite3.connect(path)
+  conn.execute("""CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, company TEXT, location TEXT, date TEXT,
+                  job_url TEXT, job_description TEXT, score REAL, applied INTEGER, interview INTEGER, rejected INTEGER, hidden INTEGER)""")
+  insert_job(conn, 'Existing Designer')
+  return conn
+
+
+def parse_events(stream):
+  # (id, card) for every job event in a list of SSE messages
+  events = []
+  for message in stream:
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n') if not line.startswith(':'))
+    if fields.get('event') == 'job':
+      events.append((int(fields['id']), json.loads(fields['data'])))
+  return events
+
+
+def test_row_versions_follow_inserts_and_status_changes(tmp_path):
+  conn = make_db(tmp_path / 'jobs.db')
+  ensure_row_versions(conn, 'jobs')
+  ensure_row_versions(conn, 'jobs')  # idempotent
+  assert conn.execute("SELECT row_version FROM jobs").fetchall() == [(1,)]
+
+  insert_job(conn, 'New Designer')
+  conn.execute("UPDATE jobs SET applied = 1 WHERE id = 1")
+  conn.execute("UPDATE jobs SET job_description = 'text' WHERE id = 2")  # not a card change
+  conn.commit()
+  assert conn.execute("SELECT id, row_version FROM jobs ORDER BY id").fetchall() == [(1, 3), (2, 2)]
+
+
+def test_job_events_resume_after_a_row_version(tmp_path):
+  path = tmp_path / 'jobs.db'
+  conn = make_db(path)
+  ensure_row_versions(conn, 'jobs')
+  insert_job(conn, 'New Designer')
+  conn.execute("UPDATE jobs SET hidden = 1 WHERE id = 1")
+  conn.commit()
+
+  events = parse_events(job_events(str(path), since=1, poll_seconds=0, max_seconds=0.05))
+  assert [(version, card['id'], card['hidden']) for version, card in events] == [(2, 2, 0), (3, 1, 1)]
+  assert 'job_description' not in events[0][1]
+
+  assert parse_events(job_events(str(path), since=3, poll_seconds=0, max_seconds=0.05)) == []
+
+
+def test_events_rejects_a_bad_since():
+  response = app.test_client().get('/events?since=abc')
+  assert response.status_code == 400
+
+
+def test_get_cover_letter(tmp_path, monkeypatch):
+  path = tmp_path / 'jobs.db'
+  conn = make_db(path)
+  conn.execute("ALTER TABLE jobs ADD COLUMN cover_letter TEXT")
+  insert_job(conn, 'New Designer')
+  conn.execute("UPDATE jobs SET cover_letter = ? WHERE id = 2", (compress_text('Dear Acme', compressor(conn)),))
+  conn.commit()
+  monkeypatch.setitem(app_module.config, 'db_path', str(path))
+  client = app.test_client()
+
+  assert client.get('/get_cover_letter/2').get_json() == {'cover_letter': 'Dear Acme'}
+  # The job exists but has no cover letter yet
+  response = client.get('/get_cover_letter/1')
+  assert response.status_code == 200 and response.get_json() == {'cover_letter': None}
+  assert client.get('/get_cover_letter/3').status_code == 404
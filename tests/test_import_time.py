@@ -0,0 +1,10 @@
+from benchmarks.import_time import BUDGETS_US, check, measure_import
+
+
+def test_entry_points_do_not_import_heavy_modules():
+  # Guards against heavy dependencies creeping back into module-level imports.
+  # The time budgets are checked by `python -m benchmarks.import_time --repeat N`, not here:
+  # a single wall-clock run is too noisy on shared CI runners.
+  results = [measure_import(module) for module in BUDGETS_US]
+  problems = check(results, timing=False)
+  assert not problems, "\n".join(problems)
@@ -0,0 +1,48 @@
+from metrics import Metrics
+
+
+def test_spans_nest_and_feed_stage_histogram():
+  registry = Metrics()
+  with registry.span('run'):
+    with registry.span('fetch'):
+      pass
+
+  spans = {span['name']: span for span in registry.report()['spans']}
+  assert spans['fetch']['parent'] == 'run'
+  assert spans['run']['parent'] is None
+  stages = {h['labels']['stage'] for h in registry.report()['histograms'] if h['name'] == 'stage_seconds'}
+  assert stages == {'run', 'fetch'}
+
+
+def test_prometheus_export():
+  registry = Metrics(namespace='test')
+  registry.inc('fetch_bytes_total', 100, host='www.linkedin.com')
+  registry.inc('fetch_bytes_total', 50, host='www.linkedin.com')
+  registry.observe('fetch_seconds', 0.02, host='www.linkedin.com')
+
+  text = registry.to_prometheus()
+  assert '# TYPE test_fetch_bytes_total counter' in text
+  assert 'test_fetch_bytes_total{host="www.linkedin.com"} 150' in text
+  assert 'test_fetch_seconds_bucket{host="www.linkedin.com",le="0.01"} 0' in text
+  assert 'test_fetch_seconds_bucket{host="www.linkedin.com",le="0.025"} 1' in text
+  assert 'test_fetch_seconds_count{host="www.linkedin.com"} 1' in text
+
+
+def test_every_retry_is_counted_whatever_the_error(monkeypatch):
+  import requests
+
+  import main
+
+  registry = Metrics()
+  monkeypatch.setattr(main, 'REGISTRY', registry)
+
+  class FailingSession:
+    def get(self, url, **kwargs):
+      raise requests.exceptions.ConnectionError("connection refused")
+
+  config = {'proxies': {}, 'headers': {}}
+  assert main.get_with_retry('https://www.linkedin.com/jobs/view/1/', config, retries=3, delay=0, session=FailingSession()) is None
+
+  counters = {(c['name'], tuple(sorted(c['labels'].items()))): c['value'] for c in registry.report()['counters']}
+  assert counters[('fetch_retries_total', (('host', 'www.linkedin.com'),))] == 2
+  assert counters[('fetch_errors_total', (('error', 'ConnectionError'), ('host', 'www.linkedin.com')))] == 3
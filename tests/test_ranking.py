@@ -0,0 +1,64 @@
+from ranking import build_query, keyword_match, rank_jobs, select_for_descriptions, title_coverage
+
+
+def card(title, company='Acme', description=''):
+  return {'title': title, 'company': company, 'job_description': description, 'job_url': f'https://example.com/{title}'}
+
+
+def make_config(**ranking):
+  return {'search_queries': [{'keywords': 'product designer', 'location': 'United States'}],
+          'title_include': ['UX'], 'resume_path': '', 'ranking': ranking}
+
+
+def test_title_coverage_takes_the_best_phrase():
+  docs = ['Senior Product Designer', 'Visual Designer', 'Mechanical Engineer', 'UX Researcher']
+  assert title_coverage(docs, [('product', 'designer'), ('ux',)]) == [1.0, 0.5, 0.0, 1.0]
+  assert title_coverage(docs, []) == [0.0] * 4
+
+
+def test_keyword_match_saturates_repeated_terms():
+  once, often, none = keyword_match(['figma', 'figma ' * 20, 'excel'], {'figma': 1.0, 'sketch': 1.0})
+  assert none == 0
+  assert 0 < once < often < 0.5
+
+
+def test_build_query_adds_weighted_resume_terms(tmp_path):
+  resume = tmp_path / 'resume.txt'
+  resume.write_text('Figma prototyping and figma design systems for the checkout team')
+  phrases, terms = build_query(dict(make_config(resume_weight=0.5), resume_path=str(resume)))
+  assert phrases == [('product', 'designer'), ('ux',)]
+  assert terms['product'] == terms['ux'] == 1.0
+  assert terms['figma'] == 0.5
+  assert terms['prototyping'] == 0.25
+  assert 'the' not in terms and 'and' not in terms
+
+
+def test_select_for_descriptions_applies_threshold_and_budget():
+  jobs = [card('Mechanical Engineer'), card('Visual Artist'), card('UX Designer'), card('Product Designer'), card('Senior Product Designer')]
+  fetch, below_threshold, over_budget = select_for_descriptions(jobs, make_config(min_score=0.5, description_budget=2))
+
+  assert len(fetch) == 2 and len(over_budget) == 1
+  assert {job['title'] for job in fetch + over_budget} == {'UX Designer', 'Product Designer', 'Senior Product Designer'}
+  assert {job['title'] for job in below_threshold} == {'Mechanical Engineer', 'Visual Artist'}
+  assert all(job['score'] < 0.5 for job in below_threshold)
+
+
+def test_cards_that_all_match_the_query_are_fetched():
+  # A daemon cycle often holds the cards of a single search query, so every card contains its terms
+  jobs = [card('Product Designer', company=f'Company {i}') for i in range(32)]
+  fetch, below_threshold, over_budget = select_for_descriptions(jobs, make_config(min_score=0.5))
+  assert len(fetch) == 32 and below_threshold == [] and over_budget == []
+
+
+def test_scores_do_not_depend_on_the_other_cards():
+  config = make_config()
+  alone = rank_jobs([card('Product Designer')], config)[0]['score']
+  crawl = rank_jobs([card('Product Designer'), card('UX Designer'), card('Visual Designer'), card('Brand Designer')], config)
+  assert [job['score'] for job in crawl if job['title'] == 'Product Designer'] == [alone]
+
+
+def test_rank_jobs_with_descriptions_reorders_by_content():
+  jobs = [card('Designer', description='Print layouts for brochures'), card('Designer', company='Hooli', description='Own product design for our UX team')]
+  ranked = rank_jobs(jobs, make_config(), with_description=True)
+  assert ranked[0]['company'] == 'Hooli'
+  assert ranked[0]['score'] > ranked[1]['score']
@@ -0,0 +1,63 @@
+import sqlite3
+
+from storage import compressor, compress_text, decompress_text, train_dict, recompress_table, export_parquet, read_archive
+
+
+def make_db(rows):
+  conn = sqlite3.connect(':memory:')
+  conn.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, job_description TEXT, date_loaded TEXT)")
+  conn.executemany("INSERT INTO jobs (title, job_description, date_loaded) VALUES (?, ?, ?)", rows)
+  conn.commit()
+  return conn
+
+
+def test_compression_roundtrip_and_plain_text_passthrough():
+  text = "About the role\n- Lead the design of new features from discovery through launch\n" * 20
+  conn = make_db([(f"Product Designer {i}", f"Job {i}. {text} Team {i % 7}.", '2026-10-18 09:00:00') for i in range(300)])
+
+  # Old rows are plain text and come back unchanged
+  assert decompress_text("plain description", conn) == "plain description"
+
+  blob = compress_text(text, compressor(conn))
+  assert isinstance(blob, bytes) and len(blob) < len(text)
+  assert decompress_text(blob, conn) == text
+
+  # After training a dictionary every stored value is rewritten and still decodes
+  assert train_dict(conn, ['jobs'], samples=300) is not None
+  assert recompress_table(conn, 'jobs') == 300
+  value = conn.execute("SELECT job_description FROM jobs WHERE id = 5").fetchone()[0]
+  assert isinstance(value, bytes)
+  assert decompress_text(value, conn) == f"Job 4. {text} Team 4."
+
+
+def test_parquet_export_is_incremental(tmp_path):
+  import pyarrow.parquet as pq
+
+  conn = make_db([("Product Designer", "desc", '2026-10-17 09:00:00'), ("UX Designer", "desc", '2026-10-18 09:00:00')])
+  config = {'archive_dir': str(tmp_path), 'jobs_tablename': 'jobs', 'filtered_jobs_tablename': 'filtered_jobs'}
+
+  export_parquet(conn, config)
+  conn.execute("INSERT INTO jobs (title, job_description, date_loaded) VALUES ('UI Designer', 'desc', '2026-10-18 10:00:00')")
+  conn.commit()
+  export_parquet(conn, config)
+
+  files = sorted(p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob('*.parquet'))
+  assert files == ['jobs/load_date=2026-10-17/part-1-1.parquet', 'jobs/load_date=2026-10-18/part-2-2.parquet',
+                   'jobs/load_date=2026-10-18/part-3-3.parquet']
+  assert pq.read_table(tmp_path / 'jobs').num_rows == 3
+
+
+def test_parquet_archive_survives_schema_changes(tmp_path):
+  # First part: job_description is NULL in every row. Later a score column is added.
+  conn = make_db([("Product Designer", None, '2026-10-17 09:00:00')])
+  config = {'archive_dir': str(tmp_path), 'jobs_tablename': 'jobs', 'filtered_jobs_tablename': 'filtered_jobs'}
+  export_parquet(conn, config)
+
+  conn.execute("ALTER TABLE jobs ADD COLUMN score REAL")
+  conn.execute("INSERT INTO jobs (title, job_description, date_loaded, score) VALUES ('UX Designer', 'desc', '2026-10-18 09:00:00', 1.5)")
+  conn.commit()
+  export_parquet(conn, config)
+
+  rows = sorted(read_archive(conn, config, 'jobs').to_pylist(), key=lambda r: r['id'])
+  assert [(r['title'], r['job_description'], r['score'], r['load_date']) for r in rows] == [
+    ('Product Designer', None, None, '2026-10-17'), ('UX Designer', 'desc', 1.5, '2026-10-18')]
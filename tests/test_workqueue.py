@@ -0,0 +1,101 @@
+import os
+import threading
+
+import requests
+
+from workqueue import (connect_queue, enqueue, claim, complete, release, outstanding, serve_queue, RemoteQueue,
+                       start_run, delete_run, expire_runs, coordinate)
+
+
+def card(job_id):
+  return {'title': 'Product Designer', 'company': 'Acme', 'location': 'Remote', 'date': '2026-10-18',
+          'job_url': f'https://www.linkedin.com/jobs/view/{job_id}/', 'job_description': ''}
+
+
+def test_enqueue_dedupes_units(tmp_path):
+  conn = connect_queue(os.path.join(tmp_path, 'queue.db'))
+  assert enqueue(conn, 'run1', 'search', 'search:0:page0', {'url': 'http://example.com/0'})
+  assert not enqueue(conn, 'run1', 'search', 'search:0:page0', {'url': 'http://example.com/0'})
+  assert outstanding(conn, 'run1') == 1
+
+
+def test_expired_lease_results_are_written_once(tmp_path):
+  conn = connect_queue(os.path.join(tmp_path, 'queue.db'))
+  enqueue(conn, 'run1', 'search', 'search:0:page0', {'url': 'http://example.com/0'})
+
+  # The first worker stalls past its lease, so the unit is handed to a second worker
+  slow = claim(conn, 'worker-a', lease_seconds=-1, max_attempts=3)
+  fast = claim(conn, 'worker-b', lease_seconds=60, max_attempts=3)
+  assert fast['id'] == slow['id']
+  assert claim(conn, 'worker-c', lease_seconds=60, max_attempts=3) is None
+
+  assert complete(conn, fast, jobs=[card(1), card(2), card(2)])
+  assert not complete(conn, slow, jobs=[card(3)])
+
+  urls = [row[0] for row in conn.execute("SELECT job_url FROM crawl_results WHERE run_id = 'run1' ORDER BY job_url")]
+  assert urls == [card(1)['job_url'], card(2)['job_url']]
+  assert outstanding(conn, 'run1') == 0
+
+
+def test_failed_units_are_retried_then_given_up(tmp_path):
+  conn = connect_queue(os.path.join(tmp_path, 'queue.db'))
+  enqueue(conn, 'run1', 'description', 'description:1', {'job_url': card(1)['job_url']})
+
+  for _ in range(2):
+    unit = claim(conn, 'worker-a', lease_seconds=60, max_attempts=2)
+    release(conn, unit, 'timeout', max_attempts=2)
+
+  assert claim(conn, 'worker-a', lease_seconds=60, max_attempts=2) is None
+  assert conn.execute("SELECT status, last_error FROM work_units").fetchone() == ('failed', 'timeout')
+
+
+def test_remote_workers_go_through_the_queue_server(tmp_path):
+  path = os.path.join(tmp_path, 'queue.db')
+  conn = connect_queue(path)
+  enqueue(conn, 'run1', 'search', 'search:0:page0', {'url': 'http://example.com/0'})
+  server = serve_queue(path, '127.0.0.1:0')
+  try:
+    with requests.Session() as session:
+      queue = RemoteQueue(f"http://127.0.0.1:{server.server_port}", session)
+      unit = queue.claim('remote-worker', lease_seconds=60, max_attempts=3)
+      assert unit['payload'] == {'url': 'http://example.com/0'}
+      assert queue.claim('remote-worker', lease_seconds=60, max_attempts=3) is None
+
+      assert queue.complete(unit, jobs=[card(1)])
+      # A retried request after the server already committed writes nothing
+      assert not queue.complete(unit, jobs=[card(1), card(2)])
+  finally:
+    server.shutdown()
+    server.server_close()
+
+  assert conn.execute("SELECT count(*) FROM crawl_results").fetchone()[0] == 1
+  assert outstanding(conn, 'run1') == 0
+
+
+def test_finished_and_stale_runs_are_deleted(tmp_path):
+  conn = connect_queue(os.path.join(tmp_path, 'queue.db'))
+  finished, crashed, current = start_run(conn), start_run(conn), start_run(conn)
+  for run_id in (finished, crashed, current):
+    enqueue(conn, run_id, 'search', 'search:0:page0', {'url': 'http://example.com/0'})
+    complete(conn, claim(conn, 'worker-a', 60, 3, run_id=run_id), jobs=[card(1)])
+  enqueue(conn, 'unregistered', 'search', 'search:0:page0', {'url': 'http://example.com/0'})
+  conn.execute("UPDATE runs SET started_at = started_at - 7200 WHERE run_id = ?", (crashed,))
+
+  delete_run(conn, finished)
+  assert sorted(expire_runs(conn, run_timeout=3600)) == sorted([crashed, 'unregistered'])
+
+  assert [row[0] for row in conn.execute("SELECT DISTINCT run_id FROM work_units")] == [current]
+  assert [row[0] for row in conn.execute("SELECT DISTINCT run_id FROM crawl_results")] == [current]
+
+
+def test_stopped_coordinator_does_not_process_partial_results(tmp_path, monkeypatch):
+  conn = connect_queue(os.path.join(tmp_path, 'queue.db'))
+  processed = []
+  monkeypatch.setattr('workqueue.process_jobs', lambda *args, **kwargs: processed.append(args))
+  config = {'rounds': 1, 'pages_to_scrape': 2, 'timespan': 'r86400', 'db_path': os.path.join(tmp_path, 'jobs.db'),
+            'search_queries': [{'keywords': 'product designer', 'location': 'United States', 'f_WT': ''}]}
+  stop = threading.Event()
+  stop.set()
+
+  assert not coordinate(conn, config, None, start_run(conn), stop)
+  assert processed == []
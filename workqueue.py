@@ -0,0 +1,426 @@
+import json
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time as tm
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from metrics import REGISTRY, write_reports
+from ranking import select_for_descriptions
+from main import (load_config, create_connection, search_page_url, get_with_retry, transform, transform_job,
+                  filter_jobcards, find_new_jobs, is_recent, process_jobs)
+
+# A crawl is split into units: one per (query, location, page) search page, and one per job description URL.
+# Units are leased to workers. A lease that is not completed before it expires is handed to another worker.
+# Results are only written together with marking the unit done, in one transaction that checks the lease
+# token, so a unit's results land exactly once even if a slow worker finishes after its lease was taken over.
+#
+# The queue database is a local file of the coordinator's host: SQLite's WAL mode and locking don't work
+# over network filesystems. Workers on the same host open it directly. Workers on other hosts reach it
+# through a small HTTP server the coordinator runs in front of it (queue "listen" / "url" settings).
+
+DEFAULT_QUEUE_CONFIG = {
+    "db_path": "./data/queue.db",  # shared by the coordinator and every worker
+    "lease_seconds": 120,          # how long a worker may hold a unit before it is retried elsewhere
+    "max_attempts": 3,             # units that fail this many times are marked failed
+    "poll_interval": 2,            # seconds between checks while waiting for other workers
+    "idle_timeout": 60,            # a worker exits after finding no work for this long
+    "run_timeout": 21600,          # units of a run this old are deleted, e.g. after its coordinator crashed
+    "listen": None,                # "host:port" the coordinator serves the queue on, for workers on other hosts
+    "url": None,                   # workers on other hosts: the coordinator's queue, e.g. "http://crawl-1:8765"
+}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS work_units (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        unit_key TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        lease_owner TEXT,
+        lease_token TEXT,
+        lease_expires REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        UNIQUE (run_id, unit_key)
+    );
+    CREATE INDEX IF NOT EXISTS work_units_claim ON work_units (status, lease_expires);
+    CREATE TABLE IF NOT EXISTS runs (
+        run_id TEXT PRIMARY KEY,
+        started_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS crawl_results (
+        run_id TEXT NOT NULL,
+        job_url TEXT NOT NULL,
+        job TEXT NOT NULL,
+        job_description TEXT,
+        PRIMARY KEY (run_id, job_url)
+    );
+"""
+
+def queue_config(config):
+    # The optional "queue" section of config.json, filled in with defaults
+    settings = dict(DEFAULT_QUEUE_CONFIG)
+    settings.update(config.get('queue', {}))
+    return settings
+
+def connect_queue(path):
+    # Autocommit mode: every write below opens its own BEGIN IMMEDIATE transaction
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue(conn, run_id, kind, unit_key, payload):
+    # Add a unit unless the run already has one with the same key. Returns True if it was added.
+    cur = conn.execute("INSERT OR IGNORE INTO work_units (run_id, kind, unit_key, payload) VALUES (?, ?, ?, ?)",
+                       (run_id, kind, unit_key, json.dumps(payload)))
+    return cur.rowcount == 1
+
+def claim(conn, owner, lease_seconds, max_attempts, run_id=None):
+    # Lease the oldest unit that is pending or whose lease has expired. Returns None if there is no work.
+    now = tm.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        sql = """SELECT id, run_id, kind, payload FROM work_units
+                 WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) AND attempts < ?"""
+        params = [now, max_attempts]
+        if run_id is not None:
+            sql += " AND run_id = ?"
+            params.append(run_id)
+        row = conn.execute(sql + " ORDER BY id LIMIT 1", params).fetchone()
+        if row is None:
+            # Expired leases that ran out of attempts will never be claimed again
+            conn.execute("UPDATE work_units SET status = 'failed' WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                         (now, max_attempts))
+            conn.execute("COMMIT")
+            return None
+        token = uuid.uuid4().hex
+        conn.execute("""UPDATE work_units SET status = 'leased', lease_owner = ?, lease_token = ?, lease_expires = ?,
+                        attempts = attempts + 1 WHERE id = ?""", (owner, token, now + lease_seconds, row[0]))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    unit_id, unit_run_id, kind, payload = row
+    return {'id': unit_id, 'run_id': unit_run_id, 'kind': kind, 'payload': json.loads(payload), 'token': token}
+
+def complete(conn, unit, jobs=None, description=None):
+    # Store the unit's results and mark it done, only if this worker still holds the lease.
+    # Returns False (and writes nothing) when the lease expired and the unit was handed to someone else.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.execute("UPDATE work_units SET status = 'done', lease_expires = NULL WHERE id = ? AND lease_token = ? AND status = 'leased'",
+                           (unit['id'], unit['token']))
+        if cur.rowcount != 1:
+            conn.execute("ROLLBACK")
+            return False
+        for job in jobs or []:
+            conn.execute("INSERT OR IGNORE INTO crawl_results (run_id, job_url, job) VALUES (?, ?, ?)",
+                         (unit['run_id'], job['job_url'], json.dumps(job)))
+        if description is not None:
+            conn.execute("UPDATE crawl_results SET job_description = ? WHERE run_id = ? AND job_url = ?",
+                         (description, unit['run_id'], unit['payload']['job_url']))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+def release(conn, unit, error, max_attempts):
+    # Give the unit back after a failure so it is retried, or mark it failed once it is out of attempts
+    conn.execute("""UPDATE work_units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    lease_expires = NULL, last_error = ? WHERE id = ? AND lease_token = ?""",
+                 (max_attempts, str(error), unit['id'], unit['token']))
+
+def run_unit(unit, config, session):
+    # Fetch one unit with this worker's own headers/proxies. Returns the kwargs for complete().
+    url = unit['payload']['url'] if unit['kind'] == 'search' else unit['payload']['job_url']
+    soup = get_with_retry(url, config, session=session)
+    if soup is None:
+        raise RuntimeError(f"Could not fetch {url}")
+    if unit['kind'] == 'search':
+        with REGISTRY.timer('parse_seconds', page='search'):
+            return {'jobs': transform(soup)}
+    with REGISTRY.timer('parse_seconds', page='description'):
+        return {'description': transform_job(soup)}
+
+class LocalQueue:
+    # The queue operations on a SQLite connection of this host
+    def __init__(self, conn):
+        self.conn = conn
+
+    def claim(self, owner, lease_seconds, max_attempts, run_id=None):
+        return claim(self.conn, owner, lease_seconds, max_attempts, run_id)
+
+    def complete(self, unit, jobs=None, description=None):
+        return complete(self.conn, unit, jobs, description)
+
+    def release(self, unit, error, max_attempts):
+        release(self.conn, unit, error, max_attempts)
+
+class RemoteQueue:
+    # The same operations, sent to the coordinator's queue server. A request that fails after the server
+    # committed is safe to retry: complete() checks the lease token, so the results are not written twice.
+    def __init__(self, url, session, retries=3):
+        self.url = url.rstrip('/')
+        self.session = session
+        self.retries = retries
+
+    def call(self, operation, **arguments):
+        import requests
+
+        for i in range(self.retries):
+            try:
+                r = self.session.post(f"{self.url}/{operation}", json=arguments, timeout=30)
+                r.raise_for_status()
+                return r.json()['result']
+            except requests.exceptions.RequestException as e:
+                if i == self.retries - 1:
+                    raise
+                print(f"Queue server request {operation} failed, retrying: {e}")
+                tm.sleep(1)
+
+    def claim(self, owner, lease_seconds, max_attempts, run_id=None):
+        return self.call('claim', owner=owner, lease_seconds=lease_seconds, max_attempts=max_attempts, run_id=run_id)
+
+    def complete(self, unit, jobs=None, description=None):
+        return self.call('complete', unit=unit, jobs=jobs, description=description)
+
+    def release(self, unit, error, max_attempts):
+        self.call('release', unit=unit, error=str(error), max_attempts=max_attempts)
+
+class QueueRequestHandler(BaseHTTPRequestHandler):
+    # POST /claim, /complete or /release with the keyword arguments as a JSON object
+    def do_POST(self):
+        operation = self.path.strip('/')
+        if operation not in ('claim', 'complete', 'release'):
+            self.send_error(404)
+            return
+        try:
+            arguments = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            with self.server.lock:
+                result = getattr(self.server.queue, operation)(**arguments)
+        except Exception as e:
+            print(f"Queue server {operation} failed: {e}")
+            self.send_error(500, str(e))
+            return
+        body = json.dumps({'result': result}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per claim would drown the crawl's own output
+
+def serve_queue(path, listen):
+    # Serve the queue at path on "host:port" from a background thread. Returns the server, call shutdown() to stop.
+    host, port = listen.rsplit(':', 1)
+    server = HTTPServer((host, int(port)), QueueRequestHandler)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    server.queue = LocalQueue(conn)
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving the work queue on http://{host}:{server.server_port}")
+    return server
+
+def work(queue, config, session, owner, run_id=None, stop=None):
+    # Process units until there is nothing left to claim. Returns the number of units completed.
+    # queue is a LocalQueue or a RemoteQueue.
+    settings = queue_config(config)
+    completed = 0
+    while stop is None or not stop.is_set():
+        unit = queue.claim(owner, settings['lease_seconds'], settings['max_attempts'], run_id)
+        if unit is None:
+            break
+        try:
+            results = run_unit(unit, config, session)
+        except Exception as e:
+            print(f"Unit {unit['id']} ({unit['kind']}) failed: {e}")
+            queue.release(unit, e, settings['max_attempts'])
+            REGISTRY.inc('queue_units_total', kind=unit['kind'], result='error')
+            continue
+        if queue.complete(unit, **results):
+            completed += 1
+            REGISTRY.inc('queue_units_total', kind=unit['kind'], result='done')
+        else:
+            print(f"Lease on unit {unit['id']} expired, its results were discarded")
+            REGISTRY.inc('queue_units_total', kind=unit['kind'], result='lease_lost')
+    return completed
+
+def outstanding(conn, run_id):
+    # Units of the run that are still pending or being worked on
+    return conn.execute("SELECT count(*) FROM work_units WHERE run_id = ? AND status IN ('pending', 'leased')",
+                        (run_id,)).fetchone()[0]
+
+def drain(conn, config, session, run_id, stop=None):
+    # Help with the run's units and wait until other workers have finished theirs
+    settings = queue_config(config)
+    owner = worker_id()
+    while stop is None or not stop.is_set():
+        work(LocalQueue(conn), config, session, owner, run_id=run_id, stop=stop)
+        remaining = outstanding(conn, run_id)
+        if remaining == 0:
+            return
+        print(f"Waiting for {remaining} unit(s) leased by other workers...")
+        if stop is not None:
+            stop.wait(settings['poll_interval'])
+        else:
+            tm.sleep(settings['poll_interval'])
+
+def install_stop_handlers():
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, stopping after the current unit...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    return stop
+
+def start_run(conn):
+    # Register a new run and return its id
+    run_id = datetime.now().strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+    conn.execute("INSERT INTO runs (run_id, started_at) VALUES (?, ?)", (run_id, tm.time()))
+    return run_id
+
+def delete_run(conn, run_id):
+    # Drop a finished or abandoned run's units and results, descriptions included, so the queue stays small
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM work_units WHERE run_id = ?", (run_id,))
+        conn.execute("DELETE FROM crawl_results WHERE run_id = ?", (run_id,))
+        conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def expire_runs(conn, run_timeout):
+    # Delete runs older than run_timeout, whose coordinator crashed or was killed, so workers stop claiming their
+    # units. Units of runs that were never registered (queues from before runs were tracked) go as well.
+    cutoff = tm.time() - run_timeout
+    stale = [row[0] for row in conn.execute(
+        """SELECT run_id FROM runs WHERE started_at < ?
+           UNION SELECT run_id FROM work_units WHERE run_id NOT IN (SELECT run_id FROM runs)
+           UNION SELECT run_id FROM crawl_results WHERE run_id NOT IN (SELECT run_id FROM runs)""", (cutoff,))]
+    for run_id in stale:
+        delete_run(conn, run_id)
+    if stale:
+        print(f"Deleted {len(stale)} stale run(s) from the work queue")
+    return stale
+
+def coordinate(queue, config, session, run_id, stop):
+    # One distributed run. Returns False without touching the jobs database if it was stopped.
+    with REGISTRY.span('get_jobcards'):
+        for k in range(0, config['rounds']):
+            for query in config['search_queries']:
+                for i in range(0, config['pages_to_scrape']):
+                    url = search_page_url(config, query, i)
+                    enqueue(queue, run_id, 'search', f"search:{k}:{url}", {'url': url})
+        drain(queue, config, session, run_id, stop)
+        if stop.is_set():
+            return False
+        cards = [json.loads(row[0]) for row in queue.execute("SELECT job FROM crawl_results WHERE run_id = ?", (run_id,))]
+        all_jobs = filter_jobcards(cards, config)
+
+    conn = create_connection(config)
+    # Descriptions are only fetched for the new and recent jobs that rank well enough, same as process_jobs
+    with REGISTRY.span('fetch_descriptions'):
+        recent_jobs = [job for job in find_new_jobs(all_jobs, conn, config) if is_recent(job, config)]
+        jobs_to_fetch, _, _ = select_for_descriptions(recent_jobs, config)
+        for job in jobs_to_fetch:
+            enqueue(queue, run_id, 'description', f"description:{job['job_url']}", {'job_url': job['job_url']})
+        drain(queue, config, session, run_id, stop)
+        if stop.is_set():
+            # Partial results: don't store them, fetch the missing descriptions serially or send mail
+            if conn is not None:
+                conn.close()
+            return False
+        descriptions = dict(queue.execute("SELECT job_url, job_description FROM crawl_results WHERE run_id = ? AND job_description IS NOT NULL",
+                                          (run_id,)).fetchall())
+
+    # Every fetched description is served from the cache; failed units fall back to a local fetch
+    process_jobs(all_jobs, conn, config, session=session, desc_cache=descriptions)
+    return True
+
+def run_coordinator(config_file):
+    # Split the crawl into units, take part in it, then run the usual pipeline over the collected results
+    import requests
+
+    start_time = tm.perf_counter()
+    stop = install_stop_handlers()
+    config = load_config(config_file)
+    settings = queue_config(config)
+    queue = connect_queue(settings['db_path'])
+    expire_runs(queue, settings['run_timeout'])
+    server = serve_queue(settings['db_path'], settings['listen']) if settings['listen'] else None
+    run_id = start_run(queue)
+    print(f"Starting distributed run {run_id}")
+
+    try:
+        with requests.Session() as session, REGISTRY.span('run'):
+            finished = coordinate(queue, config, session, run_id, stop)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        # The results have been stored (or the run was given up), so its units must not be handed out again
+        delete_run(queue, run_id)
+        queue.close()
+    if finished:
+        print(f"Distributed run {run_id} finished in {tm.perf_counter() - start_time:.2f} seconds")
+    else:
+        print(f"Distributed run {run_id} stopped, nothing was stored")
+    write_reports(config)
+
+def run_worker(config_file):
+    # Claim and process units from any run until the queue stays empty for idle_timeout seconds
+    import requests
+
+    stop = install_stop_handlers()
+    config = load_config(config_file)
+    settings = queue_config(config)
+    owner = worker_id()
+    print(f"Worker {owner} started")
+
+    idle_since = tm.time()
+    with requests.Session() as session:
+        if settings['url']:
+            queue, conn = RemoteQueue(settings['url'], session), None
+        else:
+            conn = connect_queue(settings['db_path'])
+            queue = LocalQueue(conn)
+        while not stop.is_set():
+            try:
+                completed = work(queue, config, session, owner, stop=stop)
+            except OSError as e:
+                # The coordinator's queue server is down, e.g. between runs. Keep waiting until idle_timeout.
+                print(f"Work queue unreachable: {e}")
+                completed = 0
+            if completed:
+                idle_since = tm.time()
+            elif tm.time() - idle_since > settings['idle_timeout']:
+                print(f"No work for {settings['idle_timeout']}s, exiting")
+                break
+            else:
+                stop.wait(settings['poll_interval'])
+
+    if conn is not None:
+        conn.close()
+    write_reports(config)
+    print(f"Worker {owner} stopped")